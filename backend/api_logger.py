@@ -49,7 +49,12 @@ class APILoggerMiddleware(BaseHTTPMiddleware):
         # Read request body
         request_body = ""
         try:
-            body_bytes = await request.body()
+            # Uploads are parsed as they stream in; buffering them here would defeat that
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                body_bytes = b""
+                request_body = f"[multipart upload, {request.headers.get('content-length', '?')} bytes]"
+            else:
+                body_bytes = await request.body()
             if body_bytes:
                 try:
                     request_body = json.dumps(json.loads(body_bytes), indent=2)
@@ -64,6 +69,11 @@ class APILoggerMiddleware(BaseHTTPMiddleware):
         # Call the actual endpoint
         response = await call_next(request)
         
+        # Don't buffer streamed responses (Server-Sent Events)
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            print(f"📝 Streaming: {method} {path} [{response.status_code}]")
+            return response
+        
         # Calculate duration
         duration_ms = (time.time() - start_time) * 1000
         
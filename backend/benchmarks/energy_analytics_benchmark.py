@@ -0,0 +1,176 @@
+"""
+Benchmark precomputed energy analyses against per-request analysis.
+
+Analyzes every user once with the per-user path (aggregate queries plus
+analyze_energy_patterns, what each request did) and once with the NumPy
+batch job, checks that both give the same analysis for every user, then
+serves /energy/analysis to concurrent clients with and without the
+precomputed rows.
+
+Uses a throwaway SQLite database file, never the configured one.
+
+Usage (from backend/):
+    python benchmarks/energy_analytics_benchmark.py [--users 2000] [--readings 200] [--clients 20] [--requests 100]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix="friendo-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import httpx
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from database import init_db, SessionLocal, AsyncSessionLocal, async_engine
+from models import User, EnergyEntry, EnergyAnalysis
+from services.energy_service import get_energy_service
+from services.energy_analytics_service import get_energy_analytics_service
+
+energy_service = get_energy_service()
+analytics_service = get_energy_analytics_service()
+
+
+def seed(users: int, readings: int) -> list:
+    """
+    Create users with `readings` readings each over the last 90 days; returns their ids.
+
+    Every tenth user only has one to five readings, so sparse profiles are compared too.
+    """
+    rng = random.Random(0)
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        user_rows = [User(name=f"user{i}", badges="[]") for i in range(users)]
+        db.add_all(user_rows)
+        db.flush()
+        user_ids = [user.id for user in user_rows]
+        for i, user_id in enumerate(user_ids):
+            db.execute(EnergyEntry.__table__.insert(), [
+                {
+                    "user_id": user_id,
+                    "energy_level": rng.randint(1, 5),
+                    "ts": now - timedelta(seconds=rng.randint(0, 90 * 24 * 60 * 60))
+                }
+                for _ in range(rng.randint(1, 5) if i % 10 == 0 else readings)
+            ])
+        energy_service.rebuild_aggregates(db)
+        db.commit()
+        return user_ids
+    finally:
+        db.close()
+
+
+def clear_analyses() -> None:
+    db = SessionLocal()
+    try:
+        db.execute(delete(EnergyAnalysis))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def per_user_loop(user_ids: list):
+    """Analyze every user one at a time, as each request used to; returns (analyses, seconds)."""
+    analyses = {}
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for user_id in user_ids:
+            hourly_averages, hourly_energy = await energy_service.get_hourly_stats(db, user_id)
+            analyses[user_id] = energy_service.analyze_energy_patterns(
+                hourly_averages,
+                hourly_energy,
+                weekly_buckets=await energy_service.get_weekly_buckets(db, user_id)
+            )
+    return analyses, time.perf_counter() - start
+
+
+async def compare(expected: dict) -> list:
+    """Ids of users whose precomputed analysis differs from `expected` (per-user loop)."""
+    mismatched = []
+    async with AsyncSessionLocal() as db:
+        for user_id, analysis in expected.items():
+            served = await energy_service.get_analysis(db, user_id)
+            served.pop("computed_at")
+            if served != analysis:
+                mismatched.append(user_id)
+    return mismatched
+
+
+async def serve(user_ids: list, clients: int, requests: int):
+    """Fire GET /energy/analysis from concurrent clients; returns (latencies_ms, seconds)."""
+    from main import app
+
+    latencies = []
+
+    async def client(seed: int, http: httpx.AsyncClient):
+        rng = random.Random(seed)
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await http.get(f"/energy/analysis/{rng.choice(user_ids)}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i, http) for i in range(clients)))
+        return latencies, time.perf_counter() - start
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(args):
+    init_db()
+    print(f"Seeding {args.users} users x {args.readings} readings...")
+    user_ids = seed(args.users, args.readings)
+
+    expected, loop_seconds = await per_user_loop(user_ids)
+    start = time.perf_counter()
+    await asyncio.to_thread(analytics_service.run_until_complete)
+    batch_seconds = time.perf_counter() - start
+    mismatched = await compare(expected)
+    print(f"{'analysis':<22}{'seconds':>9}{'users/s':>10}")
+    print(f"{'per-user loop':<22}{loop_seconds:>9.2f}{len(user_ids) / loop_seconds:>10.0f}")
+    print(f"{'batch (NumPy)':<22}{batch_seconds:>9.2f}{len(user_ids) / batch_seconds:>10.0f}"
+          f"   (includes reading the raw history and writing the rows)")
+    print(f"batch matches per-user analysis for {len(user_ids) - len(mismatched)}/{len(user_ids)} users"
+          + (f", first mismatch: user {mismatched[0]}" if mismatched else ""))
+
+    print(f"\n{args.clients} clients x {args.requests} GET /energy/analysis")
+    print(f"{'served':<22}{'req/s':>9}{'p50':>11}{'p99':>11}")
+    precomputed = await serve(user_ids, args.clients, args.requests)
+    clear_analyses()
+    live = await serve(user_ids, args.clients, args.requests)
+    for label, (latencies, elapsed) in (("per request", live), ("precomputed", precomputed)):
+        print(f"{label:<22}{len(latencies) / elapsed:>9.0f}"
+              f"{percentile(latencies, 0.5):>9.1f}ms{percentile(latencies, 0.99):>9.1f}ms")
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=200, help="readings per user")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    try:
+        asyncio.run(run(parser.parse_args()))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark event-loop lag while request handlers hit the database.
+
+Runs the same handler workload (look up a user, insert an energy reading and
+commit) from many concurrent coroutines, once with a synchronous SQLAlchemy
+session called straight from the coroutine (the old request path) and once
+through the services on an AsyncSession. A ticker task measures how late
+the event loop wakes it up, which is the delay every other in-flight request
+(e.g. one awaiting the LLM) sees.
+
+Uses a throwaway SQLite database file, never the configured one.
+
+Usage (from backend/):
+    python benchmarks/event_loop_lag_benchmark.py [--users 50] [--clients 20] [--requests 50]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix="friendo-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from datetime import datetime
+from database import init_db, SessionLocal, AsyncSessionLocal, async_engine
+from models import User, EnergyEntry
+from services.energy_service import get_energy_service
+from services.profile_service import get_profile_service
+
+energy_service = get_energy_service()
+profile_service = get_profile_service()
+
+
+def seed_users(count: int) -> list:
+    """Create `count` users and return their ids."""
+    db = SessionLocal()
+    try:
+        users = [User(name=f"user{i}", badges="[]") for i in range(count)]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+    finally:
+        db.close()
+
+
+async def sync_handler(user_id: int, level: int):
+    """The old request path: synchronous session inside an async handler."""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        db.add(EnergyEntry(user_id=user.id, energy_level=level, ts=datetime.now()))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def async_handler(user_id: int, level: int):
+    """The current request path: the services on an AsyncSession."""
+    async with AsyncSessionLocal() as db:
+        user = await profile_service.get_user_model(db, user_id)
+        await energy_service.add_energy_entry(db, user.id, level)
+
+
+async def measure(handler, user_ids: list, clients: int, requests: int, interval: float):
+    """Run the workload while sampling event-loop lag; returns (lags_ms, seconds)."""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append((time.perf_counter() - start - interval) * 1000)
+
+    async def client(seed: int):
+        rng = random.Random(seed)
+        for _ in range(requests):
+            await handler(rng.choice(user_ids), rng.randint(1, 5))
+
+    monitor = asyncio.create_task(ticker())
+    await asyncio.sleep(interval * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await monitor
+    return lags, elapsed
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(args):
+    init_db()
+    user_ids = seed_users(args.users)
+    total = args.clients * args.requests
+    interval = args.interval_ms / 1000
+
+    print(f"{args.clients} clients x {args.requests} requests, ticker every {args.interval_ms}ms")
+    print(f"{'session':<16}{'req/s':>9}{'ticks':>7}{'lag p50':>11}{'lag p99':>11}{'lag max':>11}")
+    for label, handler in (("sync (before)", sync_handler), ("async (after)", async_handler)):
+        lags, elapsed = await measure(handler, user_ids, args.clients, args.requests, interval)
+        if not lags:
+            lags = [elapsed * 1000]  # The ticker never got to run until the end
+        print(
+            f"{label:<16}{total / elapsed:>9.0f}{len(lags):>7}"
+            f"{statistics.median(lags):>9.1f}ms{percentile(lags, 0.99):>9.1f}ms{max(lags):>9.1f}ms"
+        )
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    try:
+        asyncio.run(run(parser.parse_args()))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark PII masking on 500-character goals.
+
+Compares the compiled masking engine in services/pii_masking_service.py with
+the original per-pattern implementation (kept below as the reference) and
+checks that both produce identical masked text and mappings.
+
+Usage (from backend/):
+    python benchmarks/pii_masking_benchmark.py [--goals 300] [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pii_masking_service import PIIMaskingService
+
+
+class ReferencePIIMasking:
+    """The original mask_text: ~30 uncompiled scans plus str.replace."""
+
+    PATTERNS = PIIMaskingService.PATTERNS
+    NAME_PREFIXES = PIIMaskingService.NAME_PREFIXES
+    LOCATION_INDICATORS = PIIMaskingService.LOCATION_INDICATORS
+
+    def _generate_placeholder(self, pii_type):
+        self._counter += 1
+        return f"[{pii_type.upper()}_{self._counter}]"
+
+    def mask_text(self, text):
+        self._mask_map = {}
+        self._reverse_map = {}
+        self._counter = 0
+        masked_text = text
+
+        for match in re.finditer(self.PATTERNS['email'], masked_text, re.IGNORECASE):
+            original = match.group()
+            placeholder = self._generate_placeholder('EMAIL')
+            self._mask_map[placeholder] = original
+            self._reverse_map[original] = placeholder
+            masked_text = masked_text.replace(original, placeholder, 1)
+
+        for key, pii_type in (('phone', 'PHONE'), ('ssn', 'SSN'), ('credit_card', 'CARD')):
+            for match in re.finditer(self.PATTERNS[key], masked_text):
+                original = match.group()
+                if original not in self._reverse_map:
+                    placeholder = self._generate_placeholder(pii_type)
+                    self._mask_map[placeholder] = original
+                    self._reverse_map[original] = placeholder
+                    masked_text = masked_text.replace(original, placeholder, 1)
+
+        for prefix in self.NAME_PREFIXES:
+            pattern = rf'\b{prefix}\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\b'
+            for match in re.finditer(pattern, masked_text, re.IGNORECASE):
+                original = match.group(1)
+                if original not in self._reverse_map:
+                    placeholder = self._generate_placeholder('NAME')
+                    self._mask_map[placeholder] = original
+                    self._reverse_map[original] = placeholder
+                    masked_text = masked_text.replace(original, placeholder, 1)
+
+        for indicator in self.LOCATION_INDICATORS:
+            pattern = rf'\b(\d+\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+{indicator})\b'
+            for match in re.finditer(pattern, masked_text, re.IGNORECASE):
+                original = match.group()
+                if original not in self._reverse_map:
+                    placeholder = self._generate_placeholder('LOCATION')
+                    self._mask_map[placeholder] = original
+                    self._reverse_map[original] = placeholder
+                    masked_text = masked_text.replace(original, placeholder, 1)
+
+        return masked_text, self._mask_map.copy()
+
+
+WORDS = [
+    "clean", "my", "room", "finish", "the", "report", "call", "about", "laundry",
+    "kitchen", "email", "taxes", "groceries", "desk", "plan", "week", "and", "then",
+    "before", "Friday", "Ann", "Annual", "review", "first", "list", "I", "a", "to",
+]
+
+PII = [
+    "jane.doe@example.com", "bob@work.org", "555-123-4567", "(555) 987 6543",
+    "123-45-6789", "4111 1111 1111 1111", "192.168.0.1", "Dr. Smith", "Mrs Ann Lee",
+    "mr Brown", "Prof Adams", "42 Main Street", "Elm st", "Oak Avenue", "apt",
+    "Sunset Blvd", "Suite", "Dr", "St", "Ann", "Meet Dr Smith on Main street",
+]
+
+
+def make_goal(rng: random.Random, pii_rate: float, length: int = 500) -> str:
+    """Random goal text of roughly `length` characters."""
+    parts = []
+    size = 0
+    while size < length:
+        token = rng.choice(PII) if rng.random() < pii_rate else rng.choice(WORDS)
+        if rng.random() < 0.1:
+            token += rng.choice([",", ".", "!"])
+        parts.append(token)
+        size += len(token) + 1
+    return " ".join(parts)[:length]
+
+
+def time_masking(mask_text, goals, repeat: int) -> float:
+    """Best-of-`repeat` microseconds per goal."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for goal in goals:
+            mask_text(goal)
+        best = min(best, time.perf_counter() - start)
+    return best / len(goals) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--goals", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reference = ReferencePIIMasking()
+    compiled = PIIMaskingService()
+
+    print(f"{'goal mix':<22}{'reference':>14}{'compiled':>14}{'speedup':>10}")
+    for label, pii_rate in (("no PII", 0.0), ("some PII (2%)", 0.02), ("PII-heavy (15%)", 0.15)):
+        goals = [make_goal(rng, pii_rate) for _ in range(args.goals)]
+
+        mismatches = [g for g in goals if reference.mask_text(g) != compiled.mask_text(g)]
+        if mismatches:
+            print(f"MISMATCH ({len(mismatches)} goals), first:\n{mismatches[0]}")
+            sys.exit(1)
+
+        ref_us = time_masking(reference.mask_text, goals, args.repeat)
+        new_us = time_masking(compiled.mask_text, goals, args.repeat)
+        print(f"{label:<22}{ref_us:>11.1f} us{new_us:>11.1f} us{ref_us / new_us:>9.1f}x")
+
+    print("Outputs identical for all goals.")
+
+
+if __name__ == "__main__":
+    main()
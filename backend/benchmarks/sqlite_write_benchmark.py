@@ -0,0 +1,201 @@
+"""
+Benchmark concurrent /energy/log and /tasks/complete writes across workers.
+
+Each worker is a separate process (like a gunicorn worker) serving the app
+in-process and firing concurrent requests at a shared SQLite file. The run
+is repeated with SQLite's defaults (rollback journal, synchronous=FULL,
+pysqlite's 5s busy wait, 2MB cache, pool of 5) and with the storage.py
+profile from the environment/.env defaults (WAL, synchronous=NORMAL, ...).
+
+A share of the requests (--llm-share) are /tasks/decompose calls whose LLM
+answer takes --llm-ms, so connections held across the LLM wait show up as
+pool timeouts. The LLM is replaced by a sleep in the benchmark workers; no
+provider is called.
+
+Uses throwaway database files, never the configured one.
+
+Usage (from backend/):
+    python benchmarks/sqlite_write_benchmark.py [--workers 2] [--clients 16] [--requests 100] [--llm-share 0.1] [--llm-ms 1000]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Equivalent to an untuned engine; journal mode persists in the file
+DEFAULT_PROFILE = {
+    "SQLITE_JOURNAL_MODE": "DELETE",
+    "SQLITE_SYNCHRONOUS": "FULL",
+    "SQLITE_BUSY_TIMEOUT_MS": "5000",
+    "SQLITE_MMAP_SIZE": "0",
+    "SQLITE_CACHE_SIZE_KB": "2000",
+    "SQLITE_TEMP_STORE": "DEFAULT",
+    "DB_POOL_SIZE": "5",
+    "DB_MAX_OVERFLOW": "10",
+}
+
+# What the simulated LLM answers for every goal
+DECOMPOSITION = {
+    "steps": [{"step_number": 1, "action": "Open the document", "estimated_minutes": 2}],
+    "all_steps": [{"step_number": 1, "action": "Open the document", "estimated_minutes": 2}],
+    "total_steps": 1,
+    "complexity_score": 3,
+}
+
+
+def _configure(db_path: str, profile: dict, workers: int):
+    """Point the app at the benchmark database (before it is imported)."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["WORKERS"] = str(workers)
+    os.environ.update(profile)
+    os.environ.setdefault("ENCRYPTION_KEY", "")
+
+
+def setup_database(db_path: str, profile: dict, workers: int, users: int) -> list:
+    """Create the schema plus users with one long task each; returns (user_id, task_id) pairs."""
+    _configure(db_path, profile, workers)
+    from database import init_db, SessionLocal
+    from models import User, Task
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user_rows = [User(name=f"user{i}", badges="[]") for i in range(users)]
+        db.add_all(user_rows)
+        db.flush()
+        tasks = [
+            Task(user_id=user.id, original_goal="benchmark", micro_steps="[]", total_steps=10 ** 9)
+            for user in user_rows
+        ]
+        db.add_all(tasks)
+        db.commit()
+        return [(task.user_id, task.id) for task in tasks]
+    finally:
+        db.close()
+
+
+def run_worker(db_path: str, profile: dict, workers: int, pairs: list, clients: int,
+               requests: int, llm_share: float, llm_ms: int, seed: int) -> dict:
+    """Serve the app in this process and fire `clients` x `requests` requests at it."""
+    _configure(db_path, profile, workers)
+    import httpx
+    from main import app
+    from database import async_engine
+    from services.llm_service import get_llm_service
+
+    async def slow_llm(goal, budget, handoff_token=None):
+        await asyncio.sleep(llm_ms / 1000)
+        return DECOMPOSITION, None
+
+    get_llm_service().decompose_task_within = slow_llm
+
+    latencies = {"db": [], "llm": []}
+    errors = {}
+
+    async def client(rng: random.Random, http: httpx.AsyncClient):
+        for _ in range(requests):
+            user_id, task_id = rng.choice(pairs)
+            draw = rng.random()
+            if draw < llm_share:
+                path, body = "/tasks/decompose", {"user_id": user_id, "goal": "Write the report"}
+            elif draw < llm_share + (1 - llm_share) / 2:
+                path, body = "/energy/log", {"user_id": user_id, "energy_level": rng.randint(1, 5)}
+            else:
+                path, body = "/tasks/complete", {"user_id": user_id, "task_id": task_id}
+            start = time.perf_counter()
+            try:
+                response = await http.post(path, json=body)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies["llm" if path == "/tasks/decompose" else "db"].append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+
+    async def main():
+        # Only the request phase counts; spawning and importing the app don't
+        window[0] = time.time()
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            await asyncio.gather(*(
+                client(random.Random(seed * 1000 + i), http) for i in range(clients)
+            ))
+        window[1] = time.time()
+        await async_engine.dispose()
+
+    window = [0.0, 0.0]
+    asyncio.run(main())
+    return {"latencies": latencies, "errors": errors, "window": window}
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_profile(label: str, profile: dict, args, ctx) -> None:
+    tmp_dir = tempfile.mkdtemp(prefix="friendo-bench-")
+    db_path = os.path.join(tmp_dir, "bench.db")
+    try:
+        with ctx.Pool(1) as pool:
+            pairs = pool.apply(setup_database, (db_path, profile, args.workers, args.users))
+
+        with ctx.Pool(args.workers) as pool:
+            results = pool.starmap(run_worker, [
+                (db_path, profile, args.workers, pairs, args.clients, args.requests,
+                 args.llm_share, args.llm_ms, worker)
+                for worker in range(args.workers)
+            ])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    latencies = [ms for result in results for ms in result["latencies"]["db"]]
+    llm_latencies = [ms for result in results for ms in result["latencies"]["llm"]]
+    elapsed = max(r["window"][1] for r in results) - min(r["window"][0] for r in results)
+    errors = {}
+    for result in results:
+        for status, count in result["errors"].items():
+            errors[status] = errors.get(status, 0) + count
+    error_text = ", ".join(f"{status}: {count}" for status, count in errors.items()) or "none"
+    print(
+        f"{label:<10}{(len(latencies) + len(llm_latencies)) / elapsed:>9.0f}{percentile(latencies, 0.5):>9.1f}ms"
+        f"{percentile(latencies, 0.99):>9.1f}ms{percentile(latencies, 0.995):>9.1f}ms{max(latencies):>9.1f}ms   errors: {error_text}"
+    )
+    if llm_latencies:
+        print(f"{'':<10}{'':>9}{percentile(llm_latencies, 0.5):>9.1f}ms"
+              f"{percentile(llm_latencies, 0.99):>9.1f}ms{'':>11}{max(llm_latencies):>9.1f}ms   (/tasks/decompose)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients per worker")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--llm-share", type=float, default=0.1, help="share of /tasks/decompose requests")
+    parser.add_argument("--llm-ms", type=int, default=1000, help="simulated LLM latency")
+    args = parser.parse_args()
+
+    # Children re-import the app with their own environment
+    ctx = multiprocessing.get_context("spawn")
+
+    print(f"{args.workers} workers x {args.clients} clients x {args.requests} requests "
+          f"({args.llm_share:.0%} /tasks/decompose with a {args.llm_ms}ms LLM, "
+          f"the rest split between /energy/log and /tasks/complete)")
+    print("req/s counts every request; latencies are for the database writes, then for decompose")
+    print(f"{'profile':<10}{'req/s':>9}{'p50':>11}{'p99':>11}{'p99.5':>11}{'max':>11}")
+    run_profile("default", DEFAULT_PROFILE, args, ctx)
+    run_profile("tuned", {}, args, ctx)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,10 +27,56 @@ class Settings:
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./friendo.db")
     
+    # SQLite pragmas applied on every connection (see storage.py)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(16 * 1024)))
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    
+    # Connection pool: DB_MAX_CONNECTIONS is shared by all WORKERS processes;
+    # DB_POOL_SIZE > 0 sets the per-process pool size directly. SQLite has a
+    # single writer, so a few connections beat many busy-waiting ones.
+    # DB_MAX_OVERFLOW extra connections per process are opened only while the
+    # pool is exhausted (off by default: for SQLite they add lock contention).
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "4"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "0"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    
     # Encryption key for Fernet (must be 32 url-safe base64-encoded bytes)
     # Generate with: from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())
     ENCRYPTION_KEY: str = os.getenv("ENCRYPTION_KEY", "")
     
+    # Key rotation: previous keys (comma-separated) stay valid for decryption while
+    # a background job re-encrypts users with ENCRYPTION_KEY, chunk by chunk
+    ENCRYPTION_OLD_KEYS: List[str] = [
+        k.strip() for k in os.getenv("ENCRYPTION_OLD_KEYS", "").split(",") if k.strip()
+    ]
+    REENCRYPT_ON_STARTUP: bool = os.getenv("REENCRYPT_ON_STARTUP", "true").lower() == "true"
+    REENCRYPT_CHUNK_SIZE: int = int(os.getenv("REENCRYPT_CHUNK_SIZE", "200"))
+    REENCRYPT_WORKERS: int = int(os.getenv("REENCRYPT_WORKERS", "4"))
+    
+    # Cache of decrypted profile fields, keyed on user id + ciphertext digest so
+    # any re-encryption invalidates it (disable to keep plaintext out of memory)
+    PROFILE_CACHE_ENABLED: bool = os.getenv("PROFILE_CACHE_ENABLED", "true").lower() == "true"
+    PROFILE_CACHE_MAX_ENTRIES: int = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+    PROFILE_CACHE_MAX_BYTES: int = int(os.getenv("PROFILE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    PROFILE_CACHE_TTL_SECONDS: int = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+    
+    # Energy model: per-hour averages where a reading loses half its weight every
+    # ENERGY_HALF_LIFE_DAYS (rebuild aggregates after changing it)
+    ENERGY_HALF_LIFE_DAYS: float = float(os.getenv("ENERGY_HALF_LIFE_DAYS", "14"))
+    
+    # Batch job precomputing every user's energy analysis (0 = don't run it in the app)
+    ENERGY_ANALYTICS_INTERVAL_MINUTES: int = int(os.getenv("ENERGY_ANALYTICS_INTERVAL_MINUTES", "60"))
+    ENERGY_ANALYTICS_CHUNK_USERS: int = int(os.getenv("ENERGY_ANALYTICS_CHUNK_USERS", "500"))
+    
+    # Background jobs run in one worker process at a time: the worker holding a
+    # job's lease runs it and renews the lease with every chunk (see leases.py)
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+    
     # LLM Configuration (using local mock by default for privacy)
     LLM_API_URL: str = os.getenv("LLM_API_URL", "")
     LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
@@ -39,6 +85,46 @@ class Settings:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
     
+    # LLM response cache (decompositions keyed on normalized masked goal)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+    
+    # Multimodal results keyed on image content hash + masked goal (steps only, never images)
+    LLM_IMAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_IMAGE_CACHE_MAX_ENTRIES", "500"))
+    LLM_IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("LLM_IMAGE_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+    
+    # Pooled LLM HTTP clients (created once per worker, reused across requests)
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_HTTP_TIMEOUT: float = float(os.getenv("LLM_HTTP_TIMEOUT", "10"))
+    GEMINI_HTTP_TIMEOUT: float = float(os.getenv("GEMINI_HTTP_TIMEOUT", "60"))
+    
+    # LLM concurrency per worker (upstream calls in flight, blocking-work threads)
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+    LLM_EXECUTOR_WORKERS: int = int(os.getenv("LLM_EXECUTOR_WORKERS", "4"))
+    
+    # Latency budget for /tasks/decompose: past this, answer with fallback steps
+    # and upgrade the task in the background (0 disables the deadline)
+    LLM_DEADLINE_MS: int = int(os.getenv("LLM_DEADLINE_MS", "800"))
+    
+    # Speculative decomposition started by /tasks/analyze, claimed via handoff token
+    LLM_HANDOFF_TTL_SECONDS: int = int(os.getenv("LLM_HANDOFF_TTL_SECONDS", "120"))
+    LLM_HANDOFF_MAX_ENTRIES: int = int(os.getenv("LLM_HANDOFF_MAX_ENTRIES", "1000"))
+    
+    # Batch decomposition: max goals per request and goals decomposed in parallel
+    BATCH_DECOMPOSE_MAX_GOALS: int = int(os.getenv("BATCH_DECOMPOSE_MAX_GOALS", "50"))
+    BATCH_DECOMPOSE_CONCURRENCY: int = int(os.getenv("BATCH_DECOMPOSE_CONCURRENCY", "5"))
+    
+    # Per-provider circuit breaker (open -> skip provider until a probe succeeds)
+    LLM_BREAKER_FAILURE_RATE: float = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+    LLM_BREAKER_WINDOW: int = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+    LLM_BREAKER_MIN_CALLS: int = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+    LLM_BREAKER_SLOW_MS: int = int(os.getenv("LLM_BREAKER_SLOW_MS", "8000"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+    
     # Server Configuration
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
@@ -57,6 +143,11 @@ class Settings:
     # Max upload size for images (in bytes) - default 10MB
     MAX_IMAGE_SIZE: int = int(os.getenv("MAX_IMAGE_SIZE", str(10 * 1024 * 1024)))
     
+    # Image preprocessing before multimodal LLM calls (downscale + re-encode, EXIF stripped)
+    IMAGE_MAX_DIMENSION: int = int(os.getenv("IMAGE_MAX_DIMENSION", "1024"))
+    IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", "80"))
+    IMAGE_FORMAT: str = os.getenv("IMAGE_FORMAT", "JPEG")  # JPEG or WEBP
+    
     @property
     def is_production(self) -> bool:
         return self.ENVIRONMENT == "production"
@@ -1,19 +1,53 @@
-from sqlalchemy import create_engine
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import get_settings
+from storage import engine_options, configure_engine
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-# Create SQLite engine with check_same_thread=False for FastAPI
-engine = create_engine(
+# Async drivers for DATABASE_URL schemes without an explicit driver
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _async_database_url(url: str) -> str:
+    """Map DATABASE_URL to its async driver (sqlite:// -> sqlite+aiosqlite://)."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+# Sync engine for startup migrations and background jobs running in threads
+# (small pool; request handlers use the async engine below)
+engine = configure_engine(create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+    **engine_options(settings.DATABASE_URL, pool_size=2)
+))
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers: queries run without blocking the event loop
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL)
+)
+configure_engine(async_engine.sync_engine)
+
+# Objects stay usable after commit (no implicit refresh, which async can't do lazily)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -25,6 +59,140 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency to get an async database session."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    End the session's transaction, returning its connection to the pool.
+    
+    Handlers call this before awaiting anything slow (LLM calls, streaming):
+    a session holds its pooled connection until the transaction ends, and
+    the pool is small. The session checks out a connection again on next
+    use; loaded objects stay usable (expire_on_commit=False).
+    """
+    await db.commit()
+
 def init_db():
     """Initialize database tables."""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _migrate_energy_logs()
+    _backfill_energy_aggregates()
+
+def _add_missing_columns():
+    """
+    Add columns introduced after a table was first created.
+    
+    create_all() never alters existing tables, so new nullable/defaulted
+    columns are added here with ALTER TABLE ... ADD COLUMN.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"
+                if column.default is not None and column.default.is_scalar:
+                    default = column.default.arg
+                    ddl += f" DEFAULT {int(default) if isinstance(default, bool) else repr(default)}"
+                conn.execute(text(ddl))
+
+def _migrate_energy_logs(batch_size: int = 500):
+    """
+    Move legacy users.energy_log JSON blobs into the energy_entries table.
+    
+    Each batch of users is copied and their blob reset to "[]" in one
+    transaction, so an interrupted migration picks up where it stopped and
+    later startups find nothing to do.
+    """
+    users = Base.metadata.tables.get("users")
+    entries = Base.metadata.tables.get("energy_entries")
+    if users is None or entries is None:
+        return
+    
+    # Imported here: services import models, which import this module
+    from services.energy_service import get_energy_service
+    energy_service = get_energy_service()
+    
+    migrated_users = 0
+    migrated_entries = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(users.c.id, users.c.energy_log)
+                .where(users.c.energy_log.isnot(None), users.c.energy_log.notin_(["", "[]"]))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            
+            params = []
+            for user_id, energy_log in rows:
+                try:
+                    log = json.loads(energy_log)
+                except json.JSONDecodeError:
+                    log = []
+                for entry in log if isinstance(log, list) else []:
+                    try:
+                        params.append({
+                            "user_id": user_id,
+                            "energy_level": int(entry["energy_level"]),
+                            "ts": datetime.fromisoformat(entry["timestamp"])
+                        })
+                    except (KeyError, TypeError, ValueError):
+                        continue  # Unusable entry
+            
+            if params:
+                conn.execute(entries.insert(), params)
+                energy_service.rebuild_aggregates(conn, [user_id for user_id, _ in rows])
+            conn.execute(
+                users.update()
+                .where(users.c.id.in_([user_id for user_id, _ in rows]))
+                .values(energy_log="[]")
+            )
+            migrated_users += len(rows)
+            migrated_entries += len(params)
+    
+    if migrated_users:
+        logger.info(f"Migrated {migrated_entries} energy log entries for {migrated_users} users")
+
+def _backfill_energy_aggregates():
+    """
+    Build hourly aggregates once for readings stored before they existed.
+    
+    Covers an empty aggregate table with existing readings, buckets
+    created before the time-decayed average was added (no ewma_ts) and
+    users without a weekly profile.
+    """
+    entries = Base.metadata.tables.get("energy_entries")
+    aggregates = Base.metadata.tables.get("energy_hourly_aggregates")
+    weekly = Base.metadata.tables.get("energy_weekly_profiles")
+    if entries is None or aggregates is None or weekly is None:
+        return
+    
+    from services.energy_service import get_energy_service
+    
+    with engine.begin() as conn:
+        if conn.execute(select(aggregates.c.user_id).limit(1)).first() is None:
+            if conn.execute(select(entries.c.id).limit(1)).first() is None:
+                return
+            user_ids = None
+        else:
+            user_ids = conn.execute(
+                select(aggregates.c.user_id).where(
+                    aggregates.c.ewma_ts.is_(None)
+                    | aggregates.c.user_id.notin_(select(weekly.c.user_id))
+                ).distinct()
+            ).scalars().all()
+            if not user_ids:
+                return
+        rows = get_energy_service().rebuild_aggregates(conn, user_ids)
+    logger.info(f"Built energy aggregates ({rows} hourly rows)")
@@ -0,0 +1,89 @@
+"""
+Leases for background jobs started by every worker process.
+
+Each gunicorn worker runs the app's lifespan, so each one starts the same
+background jobs. Before doing any work a job claims its lease, a row in
+job_leases naming the holding worker and an expiry; the other workers find
+it held and stand by. The holder renews the lease in the transaction of
+every chunk it writes, so if it loses the lease (it stalled past the
+expiry and another worker took over) the chunk is rolled back rather than
+written twice. A worker that dies stops renewing and its lease expires.
+
+Times are naive UTC.
+"""
+
+import os
+import uuid
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import JobLease
+from storage import UPSERT_INSERTS
+
+# Identifies this process (pids repeat across hosts and restarts)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(db: Session, name: str, seconds: float, min_interval: Optional[float] = None) -> bool:
+    """
+    Take (or keep) the lease `name` for `seconds` and commit; True if this worker holds it.
+
+    With min_interval, a lease whose last run finished less than min_interval
+    seconds ago is not taken, so a periodic job runs once per interval
+    however many workers try.
+    """
+    table = JobLease.__table__
+    upsert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if upsert is not None:
+        db.execute(upsert(table).values(name=name).on_conflict_do_nothing(index_elements=[table.c.name]))
+    elif db.get(JobLease, name) is None:
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(name=name))
+        except IntegrityError:
+            pass  # Another worker created it
+
+    now = datetime.utcnow()
+    conditions = [
+        table.c.name == name,
+        or_(table.c.owner.is_(None), table.c.owner == WORKER_ID, table.c.expires_at < now)
+    ]
+    if min_interval is not None:
+        conditions.append(or_(
+            table.c.finished_at.is_(None),
+            table.c.finished_at <= now - timedelta(seconds=min_interval)
+        ))
+    # The row lock makes concurrent claims see each other: only one matches
+    result = db.execute(
+        update(table).where(*conditions).values(owner=WORKER_ID, expires_at=now + timedelta(seconds=seconds))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def renew(db: Session, name: str, seconds: float) -> bool:
+    """
+    Extend this worker's lease inside the caller's transaction (no commit).
+
+    False if another worker holds it now; the caller should roll back.
+    """
+    table = JobLease.__table__
+    result = db.execute(
+        update(table)
+        .where(table.c.name == name, table.c.owner == WORKER_ID)
+        .values(expires_at=datetime.utcnow() + timedelta(seconds=seconds))
+    )
+    return result.rowcount == 1
+
+
+def release(db: Session, name: str, finished: bool = False) -> None:
+    """Give up this worker's lease and commit; `finished` records the end of a run (see claim)."""
+    table = JobLease.__table__
+    values = {"owner": None, "expires_at": None}
+    if finished:
+        values["finished_at"] = datetime.utcnow()
+    db.execute(update(table).where(table.c.name == name, table.c.owner == WORKER_ID).values(**values))
+    db.commit()
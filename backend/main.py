@@ -7,9 +7,14 @@ from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 
-from database import init_db
+from database import init_db, async_engine
+from storage import describe as describe_storage
 from routers import user, task, energy
 from config import get_settings
+from services.llm_service import get_llm_service
+from services.profile_service import get_profile_service
+from services.reencryption_service import get_reencryption_service
+from services.energy_analytics_service import get_energy_analytics_service
 
 # Initialize settings
 settings = get_settings()
@@ -32,6 +37,23 @@ async def lifespan(app: FastAPI):
     logger.info(f"📦 Database initialized")
     logger.info(f"🌍 Environment: {settings.ENVIRONMENT}")
     
+    # Long-lived pooled LLM clients (keep-alive, HTTP/2 where supported)
+    llm_service = get_llm_service()
+    await llm_service.open_clients()
+    logger.info("🔌 LLM clients ready")
+    
+    # Old keys configured: re-encrypt remaining users under the new key (resumes)
+    reencryption = get_reencryption_service()
+    if settings.ENCRYPTION_OLD_KEYS and settings.REENCRYPT_ON_STARTUP:
+        reencryption.start()
+        logger.info("🔑 Re-encryption job started")
+    
+    # Precompute energy analyses for all users, then periodically
+    energy_analytics = get_energy_analytics_service()
+    if settings.ENERGY_ANALYTICS_INTERVAL_MINUTES > 0:
+        energy_analytics.start()
+        logger.info("📊 Energy analytics job scheduled")
+    
     if settings.DEBUG:
         try:
             from api_logger import init_log_file
@@ -44,6 +66,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info(f"👋 {settings.APP_NAME} shutting down...")
+    await reencryption.stop()
+    await energy_analytics.stop()
+    await llm_service.close_clients()
+    await async_engine.dispose()
 
 
 # Create FastAPI app
@@ -110,7 +136,13 @@ async def health_check():
         "status": "healthy",
         "app": settings.APP_NAME,
         "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT
+        "environment": settings.ENVIRONMENT,
+        "llm_cache": get_llm_service().cache_stats(),
+        "llm_providers": get_llm_service().provider_health(),
+        "profile_cache": get_profile_service().cache_stats(),
+        "reencryption": get_reencryption_service().status(),
+        "energy_analytics": get_energy_analytics_service().status(),
+        "database": describe_storage(async_engine.sync_engine)
     }
 
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, Float, Index, LargeBinary
 from sqlalchemy.sql import func
 from database import Base
 
@@ -21,7 +21,7 @@ class User(Base):
     streak_count = Column(Integer, default=0)
     badges = Column(Text, default="[]")  # JSON array of badge names
     
-    # Energy tracking (JSON array of energy logs)
+    # Legacy energy log (JSON array); moved into energy_entries on startup
     energy_log = Column(Text, default="[]")
     
     # Timestamps
@@ -41,5 +41,82 @@ class Task(Base):
     total_steps = Column(Integer, nullable=False)
     is_completed = Column(Boolean, default=False)
     complexity_score = Column(Integer, default=0)  # Cognitive load meter
+    is_provisional = Column(Boolean, default=False)  # Fallback steps awaiting LLM upgrade
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class EnergyEntry(Base):
+    """A single energy reading (append-only)."""
+    __tablename__ = "energy_entries"
+    __table_args__ = (
+        Index("ix_energy_entries_user_ts", "user_id", "ts"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    energy_level = Column(Integer, nullable=False)  # 1-5
+    ts = Column(DateTime, nullable=False)  # Local time, matching the hour-of-day buckets
+
+
+class EnergyHourlyAggregate(Base):
+    """Per-user, per-hour-of-day energy statistics, kept in step with energy_entries."""
+    __tablename__ = "energy_hourly_aggregates"
+    
+    user_id = Column(Integer, primary_key=True)
+    hour = Column(Integer, primary_key=True)  # 0-23
+    total = Column(Integer, nullable=False, default=0)  # Sum of energy levels
+    count = Column(Integer, nullable=False, default=0)
+    
+    # Time-decayed average: weighted sum and weight as of ewma_ts (see EnergyService)
+    ewma_sum = Column(Float, nullable=False, default=0.0)
+    ewma_weight = Column(Float, nullable=False, default=0.0)
+    ewma_ts = Column(DateTime, nullable=True)
+
+
+class EnergyWeeklyProfile(Base):
+    """Per-user day-of-week x hour energy totals, packed into one fixed-size array."""
+    __tablename__ = "energy_weekly_profiles"
+    
+    user_id = Column(Integer, primary_key=True)
+    # 168 totals then 168 counts, little-endian uint32 (see EnergyService.WEEKLY_FORMAT)
+    buckets = Column(LargeBinary, nullable=False)
+
+
+class EnergyAnalysis(Base):
+    """Per-user energy analysis precomputed by the batch job (EnergyAnalyticsService)."""
+    __tablename__ = "energy_analyses"
+    
+    user_id = Column(Integer, primary_key=True)
+    analysis = Column(Text, nullable=False)  # JSON, EnergyService.analyze_energy_patterns without the current hour
+    hourly_energy = Column(LargeBinary, nullable=False)  # The day's 24 unrounded hourly predictions (EnergyService.hourly_predictions, HOURLY_FORMAT)
+    last_reading_ts = Column(DateTime, nullable=True)  # Latest reading included
+    computed_at = Column(DateTime, nullable=False)
+
+
+class ReencryptionJob(Base):
+    """Progress of re-encrypting user data under a new primary key (resumable)."""
+    __tablename__ = "reencryption_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key_id = Column(String(32), nullable=False, unique=True, index=True)  # Fingerprint of the target key
+    status = Column(String(20), default="running")  # running, completed, failed
+    last_user_id = Column(Integer, default=0)  # Users up to this id are done
+    total_users = Column(Integer, default=0)
+    processed_users = Column(Integer, default=0)
+    rotated_fields = Column(Integer, default=0)
+    failed_fields = Column(Integer, default=0)  # Not decryptable with any configured key
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class JobLease(Base):
+    """Which worker process runs a background job (see leases.py)."""
+    __tablename__ = "job_leases"
+    
+    name = Column(String(64), primary_key=True)  # e.g. "energy_analytics"
+    owner = Column(String(128), nullable=True)  # leases.WORKER_ID of the holder, NULL when released
+    expires_at = Column(DateTime, nullable=True)  # UTC; another worker may take over after this
+    finished_at = Column(DateTime, nullable=True)  # UTC; when the last run finished
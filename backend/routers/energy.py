@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from schemas import EnergyLogRequest, EnergyAnalysisResponse
 from services.energy_service import get_energy_service
 from services.profile_service import get_profile_service
@@ -11,7 +11,7 @@ profile_service = get_profile_service()
 
 
 @router.post("/log")
-async def log_energy(request: EnergyLogRequest, db: Session = Depends(get_db)):
+async def log_energy(request: EnergyLogRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Log current energy level (1-5).
     
@@ -19,20 +19,14 @@ async def log_energy(request: EnergyLogRequest, db: Session = Depends(get_db)):
     Used to build personalized energy schedule.
     """
     # Get user
-    user = profile_service.get_user_model(db, request.user_id)
+    user = await profile_service.get_user_model(db, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Add energy entry
-    updated_log = energy_service.add_energy_entry(
-        user.energy_log,
-        request.energy_level
-    )
-    
-    # Save to database
-    success = profile_service.update_energy_log(db, request.user_id, updated_log)
-    
-    if not success:
+    # Append the reading
+    try:
+        await energy_service.add_energy_entry(db, request.user_id, request.energy_level)
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to save energy log")
     
     return {
@@ -43,23 +37,27 @@ async def log_energy(request: EnergyLogRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/analysis/{user_id}")
-async def get_energy_analysis(user_id: int, db: Session = Depends(get_db)):
+async def get_energy_analysis(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get energy pattern analysis for user.
     
     Returns:
-    - Hourly energy averages
+    - Hourly energy averages (plain, and time-decayed for recommendations)
+    - Day-of-week x hour profile (empty slots smoothed from neighbors)
     - Peak energy hours
     - Low energy hours  
     - Recommended schedule by task complexity
+    - Peak, low and best hours for tomorrow
+    
+    Served from the batch job's precomputed analysis when the user has one.
     """
     # Get user
-    user = profile_service.get_user_model(db, user_id)
+    user = await profile_service.get_user_model(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Analyze energy patterns
-    analysis = energy_service.analyze_energy_patterns(user.energy_log)
+    # Precomputed analysis, or analyze energy patterns now
+    analysis = await energy_service.get_analysis(db, user_id)
     
     return {
         "user_id": user_id,
@@ -68,7 +66,7 @@ async def get_energy_analysis(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/suggestion/{user_id}")
-async def get_current_suggestion(user_id: int, db: Session = Depends(get_db)):
+async def get_current_suggestion(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get current energy-based suggestion.
     
@@ -76,12 +74,12 @@ async def get_current_suggestion(user_id: int, db: Session = Depends(get_db)):
     suggests what type of task to work on now.
     """
     # Get user
-    user = profile_service.get_user_model(db, user_id)
+    user = await profile_service.get_user_model(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get current analysis
-    analysis = energy_service.analyze_energy_patterns(user.energy_log)
+    analysis = await energy_service.get_analysis(db, user_id)
     
     current_energy = analysis["current_predicted_energy"]
     current_label = analysis["current_energy_label"]
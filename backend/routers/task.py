@@ -1,14 +1,23 @@
 import json
+import asyncio
+import logging
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, AsyncSessionLocal, release_connection
 from models import Task
 from schemas import (
     TaskAnalyzeRequest,
     TaskAnalyzeResponse,
     TaskDecomposeRequest, 
     TaskDecomposeResponse, 
+    TaskDecomposeBatchRequest,
+    TaskDecomposeBatchItem,
+    TaskDecomposeBatchResponse,
     TaskCompleteRequest,
     TaskCompleteResponse,
     MicroStep
@@ -17,13 +26,47 @@ from services.llm_service import get_llm_service
 from services.energy_service import get_energy_service
 from services.gamification_service import get_gamification_service
 from services.profile_service import get_profile_service
+from config import get_settings
+from upload_parser import read_multipart_upload, UploadError
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
+logger = logging.getLogger(__name__)
+settings = get_settings()
 llm_service = get_llm_service()
 energy_service = get_energy_service()
 gamification_service = get_gamification_service()
 profile_service = get_profile_service()
 
+# Strong references to background upgrade jobs so they aren't garbage collected
+_background_jobs = set()
+
+
+async def _upgrade_provisional_task(task_id: int, pending: asyncio.Task):
+    """
+    Replace a task's fallback steps once the slow LLM call finishes.
+    
+    Steps are only swapped while the user hasn't completed any of them,
+    so progress through the fallback steps is never disrupted.
+    """
+    try:
+        result = await pending
+    except Exception:
+        logger.exception(f"Background decomposition failed for task {task_id}; keeping its fallback steps")
+        result = None
+    
+    async with AsyncSessionLocal() as db:
+        task = await db.get(Task, task_id)
+        if not task:
+            return
+        
+        if result and result["source"] != "fallback" and task.completed_steps == 0:
+            task.micro_steps = json.dumps(result["all_steps"])
+            task.total_steps = result["total_steps"]
+            task.complexity_score = result["complexity_score"]
+        
+        task.is_provisional = False
+        await db.commit()
+
 
 @router.post("/analyze", response_model=TaskAnalyzeResponse)
 async def analyze_task(request: TaskAnalyzeRequest):
@@ -37,20 +80,23 @@ async def analyze_task(request: TaskAnalyzeRequest):
     - needs_image: Whether an image would help
     - image_prompt: User-friendly message asking for the image
     - image_type: Description of what kind of image is needed
+    - handoff_token: When no image is needed, pass this to /tasks/decompose;
+      the decomposition was already started when this analysis returned
     """
     try:
         result = await llm_service.analyze_task_for_image(request.goal)
         return TaskAnalyzeResponse(
             needs_image=result["needs_image"],
             image_prompt=result.get("image_prompt"),
-            image_type=result.get("image_type")
+            image_type=result.get("image_type"),
+            handoff_token=result.get("handoff_token")
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze task: {str(e)}")
 
 
 @router.post("/decompose", response_model=TaskDecomposeResponse)
-async def decompose_task(request: TaskDecomposeRequest, db: Session = Depends(get_db)):
+async def decompose_task(request: TaskDecomposeRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Decompose a goal into micro-steps.
     
@@ -59,12 +105,24 @@ async def decompose_task(request: TaskDecomposeRequest, db: Session = Depends(ge
     3. Returns 2-10 steps based on task complexity (LLM decides)
     4. Includes complexity score and energy-based timing suggestion
     5. Optionally accepts image_base64 and image_mime_type for visual context
+       (prefer /tasks/decompose/upload, which takes the raw image bytes)
+    6. If the LLM misses the latency budget, fallback steps are returned with
+       is_provisional=true and replaced in the background (see GET /tasks/{id})
     """
     # Verify user exists
-    user = profile_service.get_user_model(db, request.user_id)
+    user = await profile_service.get_user_model(db, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    # Don't hold a pooled connection while waiting for the LLM
+    await release_connection(db)
     
+    if request.image_base64 and len(request.image_base64) * 3 // 4 > settings.MAX_IMAGE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds maximum size of {settings.MAX_IMAGE_SIZE // (1024 * 1024)}MB"
+        )
+    
+    pending = None
     try:
         # Decompose the task (with or without image)
         if request.image_base64 and request.image_mime_type:
@@ -75,56 +133,291 @@ async def decompose_task(request: TaskDecomposeRequest, db: Session = Depends(ge
                 request.image_mime_type
             )
         else:
-            # Standard text-only decomposition
-            result = await llm_service.decompose_task(request.goal)
+            # Standard text-only decomposition, bounded by the latency budget
+            result, pending = await llm_service.decompose_task_within(
+                request.goal,
+                settings.LLM_DEADLINE_MS / 1000,
+                handoff_token=request.handoff_token
+            )
         
-        # Get energy-based suggestion
-        hourly_averages = energy_service.calculate_hourly_averages(user.energy_log)
-        timing_suggestion = energy_service.suggest_task_timing(
-            result["complexity_score"],
-            hourly_averages
+        return await _save_decomposition(db, request.user_id, request.goal, result, pending)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to decompose task: {str(e)}")
+
+
+@router.post("/decompose/upload", response_model=TaskDecomposeResponse)
+async def decompose_task_upload(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Decompose a goal with an uploaded photo (multipart/form-data).
+    
+    Form fields: user_id, goal and a single image file part. The upload is
+    parsed as it streams in and rejected with 413 as soon as the image
+    exceeds MAX_IMAGE_SIZE; the raw bytes go straight to the LLM layer
+    without base64 encoding.
+    """
+    try:
+        upload = await read_multipart_upload(request, settings.MAX_IMAGE_SIZE)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    # Same field validation as the JSON endpoint
+    try:
+        form = TaskDecomposeRequest(
+            user_id=upload.fields.get("user_id"),
+            goal=upload.fields.get("goal"),
+            image_mime_type=upload.file_mime_type
         )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    if not upload.file_data:
+        raise HTTPException(status_code=400, detail="No image uploaded")
+    
+    if not (form.image_mime_type or "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="Uploaded file must be an image")
+    
+    # Verify user exists
+    user = await profile_service.get_user_model(db, form.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Don't hold a pooled connection while waiting for the LLM
+    await release_connection(db)
+    
+    try:
+        result = await llm_service.decompose_task_with_image_bytes(
+            form.goal,
+            upload.file_data,
+            form.image_mime_type
+        )
+        return await _save_decomposition(db, form.user_id, form.goal, result)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to decompose task: {str(e)}")
+
+
+async def _save_decomposition(
+    db: AsyncSession,
+    user_id: int,
+    goal: str,
+    result: dict,
+    pending: asyncio.Task = None
+) -> TaskDecomposeResponse:
+    """Persist a decomposition as a new Task and build the API response."""
+    # Get energy-based suggestion
+    hourly_averages = await energy_service.get_hourly_energy(db, user_id)
+    timing_suggestion = energy_service.suggest_task_timing(
+        result["complexity_score"],
+        hourly_averages
+    )
+    
+    # Create task record
+    task = Task(
+        user_id=user_id,
+        original_goal=goal,
+        micro_steps=json.dumps(result["all_steps"]),
+        completed_steps=0,
+        total_steps=result["total_steps"],
+        complexity_score=result["complexity_score"],
+        is_completed=False,
+        is_provisional=pending is not None
+    )
+    
+    db.add(task)
+    await db.commit()
+    
+    # LLM missed the deadline: upgrade the steps when it answers
+    if pending is not None:
+        job = asyncio.create_task(_upgrade_provisional_task(task.id, pending))
+        _background_jobs.add(job)
+        job.add_done_callback(_background_jobs.discard)
+    
+    # Format response
+    micro_steps = [
+        MicroStep(
+            step_number=step["step_number"],
+            action=step["action"],
+            estimated_minutes=step.get("estimated_minutes", 3)
+        )
+        for step in result["steps"]
+    ]
+    
+    return TaskDecomposeResponse(
+        task_id=task.id,
+        goal=goal,
+        micro_steps=micro_steps,
+        total_steps=result["total_steps"],
+        complexity_score=result["complexity_score"],
+        suggested_energy_window=timing_suggestion["reason"],
+        is_provisional=task.is_provisional
+    )
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/decompose/stream")
+async def decompose_task_stream(request: TaskDecomposeRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Decompose a goal into micro-steps, streamed as Server-Sent Events.
+    
+    Emits one `step` event per MicroStep as soon as the LLM produces it,
+    then a `done` event with the saved task (same shape as /tasks/decompose).
+    The Task row is persisted once the full list of steps is known. If the
+    LLM fails part way, the steps received so far are saved as a provisional
+    task that is replaced in the background (see GET /tasks/{id}).
+    Image context is not supported here; use /tasks/decompose instead.
+    """
+    if request.image_base64:
+        raise HTTPException(status_code=400, detail="Image decomposition is not available as a stream")
+    
+    # Verify user exists
+    user = await profile_service.get_user_model(db, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Don't hold a pooled connection while the response streams
+    await release_connection(db)
+    
+    async def event_stream():
+        try:
+            async for item in llm_service.decompose_task_stream(request.goal):
+                if item["event"] == "step":
+                    step = item["step"]
+                    micro_step = MicroStep(
+                        step_number=step["step_number"],
+                        action=step["action"],
+                        estimated_minutes=step.get("estimated_minutes", 3)
+                    )
+                    yield _sse_event("step", micro_step.model_dump())
+                    continue
+                
+                # Truncated by a provider failure: decompose again in the background
+                pending = None
+                if item["partial"]:
+                    pending = asyncio.ensure_future(llm_service.decompose_task(request.goal))
+                
+                # The request's session may already be closed once streaming starts
+                async with AsyncSessionLocal() as task_db:
+                    response = await _save_decomposition(
+                        task_db, request.user_id, request.goal, item, pending
+                    )
+                yield _sse_event("done", response.model_dump())
+        
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Failed to decompose task: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/decompose/batch", response_model=TaskDecomposeBatchResponse)
+async def decompose_task_batch(request: TaskDecomposeBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Decompose several goals for one user in a single request.
+    
+    Goals are masked, looked up in the cache and sent to the LLM concurrently
+    (bounded by BATCH_DECOMPOSE_CONCURRENCY). All Task rows are inserted in
+    one transaction. Results come back in input order; a goal that fails
+    carries an error instead of a result.
+    """
+    if len(request.goals) > settings.BATCH_DECOMPOSE_MAX_GOALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_DECOMPOSE_MAX_GOALS} goals per batch"
+        )
+    
+    # Verify user exists
+    user = await profile_service.get_user_model(db, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Don't hold a pooled connection while waiting for the LLM
+    await release_connection(db)
+    
+    items = [TaskDecomposeBatchItem(index=i, goal=goal) for i, goal in enumerate(request.goals)]
+    
+    # Same per-goal limits as /tasks/decompose, reported per item
+    valid = []
+    for item in items:
+        if not item.goal.strip() or len(item.goal) > 500:
+            item.error = "Goal must be between 1 and 500 characters"
+        else:
+            valid.append(item)
+    
+    results = await llm_service.decompose_many(
+        [item.goal for item in valid],
+        settings.BATCH_DECOMPOSE_CONCURRENCY
+    )
+    
+    hourly_averages = await energy_service.get_hourly_energy(db, request.user_id)
+    
+    # Insert every successful decomposition in a single transaction
+    created = []
+    for item, result in zip(valid, results):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            micro_steps = [
+                MicroStep(
+                    step_number=step["step_number"],
+                    action=step["action"],
+                    estimated_minutes=step.get("estimated_minutes", 3)
+                )
+                for step in result["steps"]
+            ]
+        except Exception as e:
+            item.error = f"Failed to decompose task: {str(e)}"
+            continue
         
-        # Create task record
         task = Task(
             user_id=request.user_id,
-            original_goal=request.goal,
+            original_goal=item.goal,
             micro_steps=json.dumps(result["all_steps"]),
             completed_steps=0,
             total_steps=result["total_steps"],
             complexity_score=result["complexity_score"],
             is_completed=False
         )
-        
         db.add(task)
-        db.commit()
-        db.refresh(task)
-        
-        # Format response
-        micro_steps = [
-            MicroStep(
-                step_number=step["step_number"],
-                action=step["action"],
-                estimated_minutes=step.get("estimated_minutes", 3)
-            )
-            for step in result["steps"]
-        ]
-        
-        return TaskDecomposeResponse(
-            task_id=task.id,
-            goal=request.goal,
+        created.append((item, result, micro_steps, task))
+    
+    try:
+        await db.flush()
+        task_ids = [task.id for _, _, _, task in created]
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save tasks: {str(e)}")
+    
+    for (item, result, micro_steps, _), task_id in zip(created, task_ids):
+        timing_suggestion = energy_service.suggest_task_timing(
+            result["complexity_score"],
+            hourly_averages
+        )
+        item.result = TaskDecomposeResponse(
+            task_id=task_id,
+            goal=item.goal,
             micro_steps=micro_steps,
             total_steps=result["total_steps"],
             complexity_score=result["complexity_score"],
             suggested_energy_window=timing_suggestion["reason"]
         )
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to decompose task: {str(e)}")
+    succeeded = sum(1 for item in items if item.result is not None)
+    return TaskDecomposeBatchResponse(
+        user_id=request.user_id,
+        results=items,
+        succeeded=succeeded,
+        failed=len(items) - succeeded
+    )
 
 
 @router.post("/complete", response_model=TaskCompleteResponse)
-async def complete_task_step(request: TaskCompleteRequest, db: Session = Depends(get_db)):
+async def complete_task_step(request: TaskCompleteRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Mark a task step as completed.
     
@@ -134,7 +427,7 @@ async def complete_task_step(request: TaskCompleteRequest, db: Session = Depends
     - Celebration message is returned
     """
     # Get task
-    task = db.query(Task).filter(Task.id == request.task_id).first()
+    task = await db.get(Task, request.task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -145,7 +438,7 @@ async def complete_task_step(request: TaskCompleteRequest, db: Session = Depends
         raise HTTPException(status_code=400, detail="Task already completed")
     
     # Get user
-    user = profile_service.get_user_model(db, request.user_id)
+    user = await profile_service.get_user_model(db, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -175,14 +468,14 @@ async def complete_task_step(request: TaskCompleteRequest, db: Session = Depends
             celebration_message += " " + " ".join(gamification_result["badge_messages"])
         
         # Update user
-        profile_service.update_streak(
+        await profile_service.update_streak(
             db, 
             request.user_id, 
             new_streak, 
             gamification_result["badges_json"]
         )
     
-    db.commit()
+    await db.commit()
     
     return TaskCompleteResponse(
         task_id=task.id,
@@ -196,9 +489,9 @@ async def complete_task_step(request: TaskCompleteRequest, db: Session = Depends
 
 
 @router.get("/{task_id}")
-async def get_task(task_id: int, db: Session = Depends(get_db)):
+async def get_task(task_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get task details by ID."""
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = await db.get(Task, task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -214,18 +507,21 @@ async def get_task(task_id: int, db: Session = Depends(get_db)):
         "total_steps": task.total_steps,
         "complexity_score": task.complexity_score,
         "is_completed": task.is_completed,
+        "is_provisional": bool(task.is_provisional),
         "created_at": task.created_at.isoformat() if task.created_at else None,
         "completed_at": task.completed_at.isoformat() if task.completed_at else None
     }
 
 
 @router.get("/user/{user_id}/active")
-async def get_active_task(user_id: int, db: Session = Depends(get_db)):
+async def get_active_task(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get user's current active (incomplete) task."""
-    task = db.query(Task).filter(
-        Task.user_id == user_id,
-        Task.is_completed == False
-    ).order_by(Task.created_at.desc()).first()
+    task = (await db.execute(
+        select(Task).where(
+            Task.user_id == user_id,
+            Task.is_completed == False
+        ).order_by(Task.created_at.desc()).limit(1)
+    )).scalar_one_or_none()
     
     if not task:
         return {"active_task": None}
@@ -241,6 +537,7 @@ async def get_active_task(user_id: int, db: Session = Depends(get_db)):
             "completed_steps": task.completed_steps,
             "total_steps": task.total_steps,
             "current_step": steps[current_step_index] if current_step_index < len(steps) else None,
-            "complexity_score": task.complexity_score
+            "complexity_score": task.complexity_score,
+            "is_provisional": bool(task.is_provisional)
         }
     }
@@ -1,22 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from schemas import UserCreate, UserPreferencesUpdate, UserResponse
 from services.profile_service import get_profile_service
 
 router = APIRouter(prefix="/users", tags=["users"])
 profile_service = get_profile_service()
 
+FIELDS_DESCRIPTION = (
+    "Comma-separated profile fields to return, e.g. name,font_preference,high_contrast. "
+    "Encrypted fields and the energy log are only loaded when requested."
+)
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a fields= query parameter, rejecting unknown names with 400."""
+    try:
+        return profile_service.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
 @router.post("/create", response_model=dict)
-async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def create_user(
+    user_data: UserCreate,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Create a new user profile.
     
     Sensitive data (triggers, preferences) is encrypted before storage.
     """
+    field_list = _parse_fields(fields)
     try:
-        user = profile_service.create_user(
+        user = await profile_service.create_user(
             db=db,
             name=user_data.name,
             font_preference=user_data.font_preference,
@@ -25,20 +44,25 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
             preferences=user_data.preferences
         )
         
-        return profile_service.get_user(db, user.id)
+        return await profile_service.get_user(db, user.id, field_list)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
 
 @router.get("/{user_id}", response_model=dict)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(
+    user_id: int,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get user profile by ID.
     
-    Sensitive data is decrypted before returning.
+    Sensitive data is decrypted before returning. Use `fields` to load
+    and return only some of the profile.
     """
-    user = profile_service.get_user(db, user_id)
+    user = await profile_service.get_user(db, user_id, _parse_fields(fields))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -50,7 +74,8 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 async def update_preferences(
     user_id: int, 
     updates: UserPreferencesUpdate, 
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update user preferences.
@@ -58,13 +83,15 @@ async def update_preferences(
     All fields are optional - only provided fields are updated.
     Sensitive data is re-encrypted on update.
     """
-    user = profile_service.update_preferences(
+    field_list = _parse_fields(fields)
+    user = await profile_service.update_preferences(
         db=db,
         user_id=user_id,
         font_preference=updates.font_preference,
         high_contrast=updates.high_contrast,
         triggers=updates.triggers,
-        preferences=updates.preferences
+        preferences=updates.preferences,
+        fields=field_list
     )
     
     if not user:
@@ -45,6 +45,7 @@ class TaskAnalyzeResponse(BaseModel):
     needs_image: bool
     image_prompt: Optional[str] = None  # Prompt to show user asking for image
     image_type: Optional[str] = None  # e.g., "photo of the space", "screenshot", etc.
+    handoff_token: Optional[str] = None  # Pass to /tasks/decompose to reuse speculative work
 
 class TaskDecomposeRequest(BaseModel):
     """Schema for task decomposition request."""
@@ -52,6 +53,7 @@ class TaskDecomposeRequest(BaseModel):
     goal: str = Field(..., min_length=1, max_length=500)
     image_base64: Optional[str] = None  # Base64 encoded image data
     image_mime_type: Optional[str] = None  # e.g., "image/jpeg", "image/png"
+    handoff_token: Optional[str] = None  # From /tasks/analyze when needs_image is false
 
 class MicroStep(BaseModel):
     """Schema for a single micro-step."""
@@ -67,6 +69,26 @@ class TaskDecomposeResponse(BaseModel):
     total_steps: int
     complexity_score: int
     suggested_energy_window: str
+    is_provisional: bool = False  # Fallback steps; refreshed via GET /tasks/{id}
+
+class TaskDecomposeBatchRequest(BaseModel):
+    """Schema for decomposing several goals for one user."""
+    user_id: int
+    goals: List[str] = Field(..., min_length=1)
+
+class TaskDecomposeBatchItem(BaseModel):
+    """Schema for one goal's outcome in a batch decomposition."""
+    index: int
+    goal: str
+    result: Optional[TaskDecomposeResponse] = None
+    error: Optional[str] = None
+
+class TaskDecomposeBatchResponse(BaseModel):
+    """Schema for batch decomposition response (results in input order)."""
+    user_id: int
+    results: List[TaskDecomposeBatchItem]
+    succeeded: int
+    failed: int
 
 class TaskCompleteRequest(BaseModel):
     """Schema for completing a task step."""
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with LRU + TTL eviction.
+
+    Entries expire after `ttl_seconds` and the least recently used
+    entry is evicted once `max_entries` is reached. Hit/miss counters
+    are kept so cache effectiveness can be monitored.
+
+    With `max_bytes` set, each value is measured with `size_of` and the
+    cache is also kept under that total; a value larger than the whole
+    budget is not stored at all.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        max_bytes: Optional[int] = None,
+        size_of: Optional[Callable[[Any], int]] = None
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._size_of = size_of or (lambda value: 0)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return cached value or None if missing/expired."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, size = item
+            if expires_at <= now:
+                del self._data[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        expires_at = time.monotonic() + self.ttl_seconds
+        size = self._size_of(value) if self.max_bytes is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return
+
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._bytes -= item[2]
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+        if self.max_bytes is not None:
+            stats.update({
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "rejected": self.rejected
+            })
+        return stats
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async calls.
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running await the same task instead of starting their own.
+    The shared task is shielded so a cancelled caller never aborts the
+    upstream call for everyone else.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` once per key at a time and share its result."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get in-flight table statistics."""
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
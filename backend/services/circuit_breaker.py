@@ -0,0 +1,127 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker tracking error rate and latency.
+
+    closed    -> calls flow normally; outcomes are recorded in a sliding window
+    open      -> calls are refused immediately (callers route elsewhere)
+    half_open -> cooldown elapsed; a single background probe decides whether
+                 to close the breaker again or re-open it
+
+    Calls slower than `slow_call_seconds` count as failures, so a provider
+    that answers but takes far too long also trips the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        slow_call_seconds: float = 5.0,
+        cooldown_seconds: float = 30.0
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self.state = self.CLOSED
+        self._outcomes: deque = deque(maxlen=window_size)  # (ok, latency_seconds)
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+        self.total_calls = 0
+        self.total_failures = 0
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        """Whether a live request may call this provider right now."""
+        return self.state == self.CLOSED
+
+    def try_start_probe(self) -> bool:
+        """
+        Move an open breaker to half-open once the cooldown has elapsed.
+
+        Returns True if the caller should launch a probe call.
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return False
+            if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            return True
+
+    def record_success(self, latency: float) -> None:
+        """Record a completed call (slow calls count as failures)."""
+        if latency > self.slow_call_seconds:
+            self.record_failure(latency)
+            return
+
+        with self._lock:
+            self.total_calls += 1
+            if self.state == self.HALF_OPEN:
+                self._outcomes.clear()
+                self.state = self.CLOSED
+                logger.info(f"Circuit '{self.name}' closed after successful probe")
+            self._outcomes.append((True, latency))
+
+    def record_failure(self, latency: float) -> None:
+        """Record a failed or too-slow call, opening the breaker if needed."""
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += 1
+            self._outcomes.append((False, latency))
+
+            if self.state == self.HALF_OPEN:
+                self._open()
+            elif self.state == self.CLOSED and self._failure_rate() >= self.failure_rate_threshold \
+                    and len(self._outcomes) >= self.min_calls:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(
+            f"Circuit '{self.name}' opened (failure rate {self._failure_rate():.0%} "
+            f"over last {len(self._outcomes)} calls)"
+        )
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get breaker state for health reporting."""
+        latencies = sorted(latency for _, latency in self._outcomes)
+        p50 = latencies[len(latencies) // 2] if latencies else None
+        return {
+            "state": self.state,
+            "failure_rate": round(self._failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "p50_latency_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "times_opened": self.times_opened
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the provider's breaker is open."""
+    pass
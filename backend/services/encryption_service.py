@@ -1,25 +1,42 @@
 import base64
 import json
-from typing import Any
-from cryptography.fernet import Fernet, InvalidToken
+import hashlib
+from typing import Any, Optional
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from config import get_settings
 
 class EncryptionService:
-    """Service for encrypting and decrypting sensitive data using Fernet (AES)."""
+    """
+    Service for encrypting and decrypting sensitive data using Fernet (AES).
+    
+    ENCRYPTION_KEY is the primary key used for all new encryption. Keys listed
+    in ENCRYPTION_OLD_KEYS are still accepted for decryption, so the primary
+    key can be rotated without downtime while rows are re-encrypted.
+    """
     
     def __init__(self):
         settings = get_settings()
         key = settings.ENCRYPTION_KEY
         
+        self.primary = self._make_fernet(key)
+        self.old_keys = [self._make_fernet(old_key) for old_key in settings.ENCRYPTION_OLD_KEYS]
+        self.fernet = MultiFernet([self.primary] + self.old_keys)
+        
+        # Short fingerprint identifying the primary key (never the key itself)
+        key_bytes = key.encode() if isinstance(key, str) else key
+        self.key_id = hashlib.sha256(key_bytes).hexdigest()[:16]
+    
+    @staticmethod
+    def _make_fernet(key: str) -> Fernet:
         # Ensure key is properly formatted for Fernet
         try:
             # Try to use the key directly
-            self.fernet = Fernet(key.encode() if isinstance(key, str) else key)
+            return Fernet(key.encode() if isinstance(key, str) else key)
         except Exception:
             # Generate a proper key from the provided string
             key_bytes = key.encode()[:32].ljust(32, b'0')
             proper_key = base64.urlsafe_b64encode(key_bytes)
-            self.fernet = Fernet(proper_key)
+            return Fernet(proper_key)
     
     def encrypt(self, data: Any) -> str:
         """
@@ -44,23 +61,47 @@ class EncryptionService:
         Decrypt data and return original value.
         Attempts to parse as JSON, returns string if not valid JSON.
         """
+        decrypted_str = self.decrypt_text(encrypted_data)
+        if decrypted_str is None:
+            return None
+        return self.parse_decrypted(decrypted_str)
+    
+    def decrypt_text(self, encrypted_data: str) -> Optional[str]:
+        """
+        Decrypt data to its plaintext string without parsing it.
+        Returns None if there is no data or decryption fails.
+        """
         if not encrypted_data:
             return None
         
         try:
-            decrypted = self.fernet.decrypt(encrypted_data.encode())
-            decrypted_str = decrypted.decode()
-            
-            # Try to parse as JSON
-            try:
-                return json.loads(decrypted_str)
-            except json.JSONDecodeError:
-                return decrypted_str
-                
+            return self.fernet.decrypt(encrypted_data.encode()).decode()
         except InvalidToken:
             # Return empty if decryption fails (corrupted or wrong key)
             return None
     
+    @staticmethod
+    def parse_decrypted(decrypted_str: str) -> Any:
+        """Parse decrypted plaintext as JSON, or return it as-is if it isn't JSON."""
+        try:
+            return json.loads(decrypted_str)
+        except json.JSONDecodeError:
+            return decrypted_str
+    
+    def reencrypt(self, encrypted_data: str) -> Optional[str]:
+        """
+        Re-encrypt a token under the primary key.
+        
+        Returns None if the token already uses the primary key. Raises
+        InvalidToken if no configured key can decrypt it.
+        """
+        token = encrypted_data.encode()
+        try:
+            self.primary.decrypt(token)
+            return None
+        except InvalidToken:
+            return self.fernet.rotate(token).decode()
+    
     def encrypt_json(self, data: dict | list) -> str:
         """Encrypt a JSON-serializable object."""
         return self.encrypt(data)
@@ -0,0 +1,367 @@
+import json
+import time
+import asyncio
+import logging
+from itertools import chain
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, exists, extract, func, or_
+import leases
+from config import get_settings
+from database import SessionLocal
+from models import User, EnergyEntry, EnergyAnalysis
+from services.energy_service import get_energy_service
+
+# NumPy is required for the batch job; without it analyses are computed per request
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class EnergyAnalyticsService:
+    """
+    Batch job precomputing every user's energy analysis into energy_analyses.
+
+    Users are processed in id order, ENERGY_ANALYTICS_CHUNK_USERS at a time.
+    A chunk's readings are loaded as arrays (hour, day of week, epoch
+    seconds) and its hourly averages, time-decayed averages, smoothed weekly
+    profiles, peaks, low-energy hours and next-day recommendations are
+    computed with NumPy for all of its users at once, using the same rules
+    as EnergyService. Python only loops over users to serialize the rows.
+
+    A chunk's rows are written in one short transaction. A row whose user
+    logged a reading after their history was read is dropped again in that
+    transaction (and a reading logged later deletes it), so the endpoints
+    never serve an analysis that misses a reading.
+
+    Every worker process schedules the job, but each pass is run by one of
+    them: the worker that claims the job's lease (see leases.py) once the
+    last pass finished at least an interval ago. The others stand by.
+    """
+
+    LEASE_NAME = "energy_analytics"
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.energy = get_energy_service()
+        self.chunk_size = max(1, self.settings.ENERGY_ANALYTICS_CHUNK_USERS)
+        self.lease_seconds = max(1, self.settings.JOB_LEASE_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+        self._started = 0.0
+        self._progress: Dict[str, Any] = {"status": "idle" if NUMPY_AVAILABLE else "unavailable"}
+
+    def start(self) -> Dict[str, Any]:
+        """Run the job now and then every ENERGY_ANALYTICS_INTERVAL_MINUTES; no-op if already scheduled."""
+        if not NUMPY_AVAILABLE:
+            logger.warning("NumPy not installed: energy analyses are computed per request")
+            return self.status()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+        return self.status()
+
+    async def stop(self) -> None:
+        """Cancel the schedule; a chunk in flight is finished by its thread but not continued."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """Get progress of the current or last run."""
+        return dict(self._progress)
+
+    async def _run_periodically(self) -> None:
+        interval = max(1, self.settings.ENERGY_ANALYTICS_INTERVAL_MINUTES) * 60
+        while True:
+            try:
+                if await asyncio.to_thread(self._claim_lease, interval):
+                    self._start_run()
+                    # Each chunk runs off the event loop; cancellation takes effect between chunks
+                    while await asyncio.to_thread(self._process_chunk):
+                        pass
+                    if self._progress["status"] == "completed":
+                        await asyncio.to_thread(self._release_lease, True)
+                elif self._progress["status"] == "idle":
+                    # Another worker ran or is running this interval's pass
+                    self._progress["status"] = "standby"
+            except asyncio.CancelledError:
+                self._progress["status"] = "stopped"
+                await asyncio.to_thread(self._release_lease, False)
+                raise
+            except Exception as e:
+                logger.exception("Energy analytics run failed")
+                self._progress.update({"status": "failed", "error": str(e)})
+                # Counts as the interval's pass: retried next interval, not by every worker now
+                await asyncio.to_thread(self._release_lease, True)
+            # Check again once a holder that stopped renewing would have lost the lease
+            await asyncio.sleep(min(interval, self.lease_seconds))
+
+    def run_until_complete(self) -> Dict[str, Any]:
+        """Analyze all users in the calling thread (used by the command line entry point)."""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("The energy analytics job requires NumPy (pip install numpy)")
+        if not self._claim_lease():
+            # A worker process is running it right now
+            return {"status": "standby"}
+        try:
+            self._start_run()
+            while self._process_chunk():
+                pass
+        finally:
+            self._release_lease(self._progress["status"] == "completed")
+        return self.status()
+
+    def _claim_lease(self, min_interval: Optional[float] = None) -> bool:
+        db = SessionLocal()
+        try:
+            return leases.claim(db, self.LEASE_NAME, self.lease_seconds, min_interval)
+        finally:
+            db.close()
+
+    def _release_lease(self, finished: bool) -> None:
+        db = SessionLocal()
+        try:
+            leases.release(db, self.LEASE_NAME, finished)
+        finally:
+            db.close()
+
+    def _start_run(self) -> None:
+        self._progress = {
+            "status": "running",
+            "started_at": datetime.now().isoformat(),
+            "last_user_id": 0,
+            "processed_users": 0,
+            "seconds": 0.0,
+            "error": None
+        }
+        self._started = time.time()
+
+    def _process_chunk(self) -> bool:
+        """
+        Analyze and store the next chunk of users.
+
+        Returns False once every user has been processed.
+        """
+        db = SessionLocal()
+        try:
+            user_ids = db.execute(
+                select(User.id)
+                .where(User.id > self._progress["last_user_id"])
+                .order_by(User.id)
+                .limit(self.chunk_size)
+            ).scalars().all()
+
+            if not user_ids:
+                self._progress["status"] = "completed"
+                self._progress["seconds"] = round(time.time() - self._started, 2)
+                logger.info(
+                    f"Energy analytics: {self._progress['processed_users']} users analyzed "
+                    f"in {self._progress['seconds']}s"
+                )
+                return False
+
+            readings, last_readings = self._load_readings(db, user_ids)
+            # End the read transaction before computing, so the write below starts fresh
+            db.rollback()
+
+            rows = self.analyze_chunk(user_ids, readings, last_readings, datetime.now())
+
+            table = EnergyAnalysis.__table__
+            db.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+            db.execute(table.insert(), rows)
+            db.execute(
+                delete(table).where(
+                    table.c.user_id.in_(user_ids),
+                    exists().where(
+                        EnergyEntry.user_id == table.c.user_id,
+                        or_(table.c.last_reading_ts.is_(None), EnergyEntry.ts > table.c.last_reading_ts)
+                    )
+                )
+            )
+            if not leases.renew(db, self.LEASE_NAME, self.lease_seconds):
+                # Stalled past the lease and another worker took over the pass
+                db.rollback()
+                self._progress["status"] = "standby"
+                return False
+            db.commit()
+
+            self._progress["last_user_id"] = user_ids[-1]
+            self._progress["processed_users"] += len(user_ids)
+            self._progress["seconds"] = round(time.time() - self._started, 2)
+            return True
+        finally:
+            db.close()
+
+    def _load_readings(self, db, user_ids: List[int]):
+        """
+        A chunk's readings as an (n, 5) float array of user id, energy level,
+        hour, day of week (0 = Sunday, as SQL returns it) and epoch seconds;
+        plus each user's latest reading time.
+        """
+        ts = EnergyEntry.ts
+        # Core execution and np.fromiter over plain values: converting Row objects
+        # with np.array is several times slower than the query itself
+        rows = db.connection().execute(
+            select(
+                EnergyEntry.user_id,
+                EnergyEntry.energy_level,
+                extract("hour", ts),
+                extract("dow", ts),
+                extract("epoch", ts)
+            ).where(EnergyEntry.user_id.in_(user_ids))
+        ).all()
+        last_readings = dict(db.execute(
+            select(EnergyEntry.user_id, func.max(ts))
+            .where(EnergyEntry.user_id.in_(user_ids))
+            .group_by(EnergyEntry.user_id)
+        ).all())
+        readings = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=5 * len(rows))
+        readings = readings.reshape(len(rows), 5)
+        return readings, last_readings
+
+    def analyze_chunk(
+        self,
+        user_ids: List[int],
+        readings: "np.ndarray",
+        last_readings: Dict[int, datetime],
+        now: datetime
+    ) -> List[Dict[str, Any]]:
+        """Compute energy_analyses rows for `user_ids` (sorted) from their readings (see _load_readings)."""
+        energy = self.energy
+        n = len(user_ids)
+        users = np.searchsorted(np.asarray(user_ids), readings[:, 0].astype(np.int64))
+        levels = readings[:, 1]
+        hours = readings[:, 2].astype(np.int64)
+        days = (readings[:, 3].astype(np.int64) + 6) % 7  # Monday = 0, like datetime.weekday()
+        seconds = readings[:, 4]
+
+        # Hourly averages, plain and time-decayed: (n, 24)
+        hourly = users * 24 + hours
+        counts = np.bincount(hourly, minlength=n * 24).reshape(n, 24)
+        totals = np.bincount(hourly, weights=levels, minlength=n * 24).reshape(n, 24)
+        has_hour = counts > 0
+        averages = np.where(has_hour, totals / np.maximum(counts, 1), 3.0)
+
+        # Each bucket's readings decay relative to its latest one, as in EnergyService._ewma_add
+        latest = np.full(n * 24, -np.inf)
+        np.maximum.at(latest, hourly, seconds)
+        if energy.half_life_seconds:
+            weights = 0.5 ** ((latest[hourly] - seconds) / energy.half_life_seconds)
+        else:
+            weights = np.ones_like(seconds)
+        decayed_sums = np.bincount(hourly, weights=weights * levels, minlength=n * 24).reshape(n, 24)
+        decayed_weights = np.bincount(hourly, weights=weights, minlength=n * 24).reshape(n, 24)
+        decayed = np.where(has_hour, decayed_sums / np.where(has_hour, decayed_weights, 1.0), 3.0)
+
+        peaks = decayed >= 4.0
+        lows = decayed <= 2.0
+
+        weekly, has_bucket = self.smooth_weekly_profiles(
+            n, users * energy.WEEK_BUCKETS + days * 24 + hours, levels
+        )
+        # Current-hour predictions for today, as in EnergyService.hourly_predictions
+        offset = now.weekday() * 24
+        predictions = np.where(has_hour, decayed, weekly[:, offset:offset + 24])
+
+        # Tomorrow's hours with readings, from the weekly profile
+        tomorrow = (now + timedelta(days=1)).date()
+        offset = tomorrow.weekday() * 24
+        next_day = weekly[:, offset:offset + 24]
+        next_observed = has_bucket[:, offset:offset + 24]
+        next_peaks = next_observed & (next_day >= 4.0)
+        next_lows = next_observed & (next_day <= 2.0)
+        ranked = np.argsort(-np.where(next_observed, next_day, -np.inf), axis=1, kind="stable")
+
+        # Serialization; Python's round() as in the per-request path (np.round can differ at .x5)
+        averages_rounded = [[round(v, 1) for v in row] for row in averages.tolist()]
+        decayed_rounded = [[round(v, 1) for v in row] for row in decayed.tolist()]
+        weekly_rounded = [
+            [[round(v, 1) for v in row[h:h + 24]] for h in range(0, energy.WEEK_BUCKETS, 24)]
+            for row in weekly.tolist()
+        ]
+        hour_keys = [str(h) for h in range(24)]
+        day_name = energy.DAY_NAMES[tomorrow.weekday()]
+
+        rows = []
+        for i, user_id in enumerate(user_ids):
+            peak_hours = np.flatnonzero(peaks[i]).tolist()
+            low_hours = np.flatnonzero(lows[i]).tolist()
+            analysis = {
+                "hourly_averages": dict(zip(hour_keys, averages_rounded[i])),
+                "hourly_energy": dict(zip(hour_keys, decayed_rounded[i])),
+                "peak_hours": peak_hours,
+                "low_energy_hours": low_hours,
+                "recommended_schedule": energy.recommended_schedule(peak_hours, low_hours),
+                "weekly_profile": dict(zip(energy.DAY_NAMES, weekly_rounded[i])),
+                "next_day": {
+                    "date": tomorrow.isoformat(),
+                    "day": day_name,
+                    "peak_hours": np.flatnonzero(next_peaks[i]).tolist(),
+                    "low_energy_hours": np.flatnonzero(next_lows[i]).tolist(),
+                    "best_hours": [
+                        h for h in ranked[i, :energy.NEXT_DAY_BEST_HOURS].tolist() if next_observed[i, h]
+                    ]
+                }
+            }
+            rows.append({
+                "user_id": user_id,
+                "analysis": json.dumps(analysis),
+                "hourly_energy": energy.HOURLY_FORMAT.pack(*predictions[i].tolist()),
+                "last_reading_ts": last_readings.get(user_id),
+                "computed_at": now
+            })
+        return rows
+
+    def smooth_weekly_profiles(self, n: int, buckets: "np.ndarray", levels: "np.ndarray"):
+        """
+        Smoothed day-of-week x hour averages, (n, 168), and which buckets have readings.
+
+        Same rules as EnergyService.smooth_weekly_profile: empty buckets take
+        the kernel-weighted mean of their non-empty neighbors, else 3.0.
+        """
+        size = self.energy.WEEK_BUCKETS
+        counts = np.bincount(buckets, minlength=n * size).reshape(n, size)
+        totals = np.bincount(buckets, weights=levels, minlength=n * size).reshape(n, size)
+        has = counts > 0
+        means = np.where(has, totals / np.maximum(counts, 1), 0.0)
+
+        weighted = np.zeros((n, size))
+        weight = np.zeros((n, size))
+        for offset, kernel_weight in self.energy.SMOOTHING_KERNEL:
+            # Column b of the rolled arrays is bucket (b + offset) % size
+            weighted += kernel_weight * np.roll(means, -offset, axis=1)
+            weight += kernel_weight * np.roll(has, -offset, axis=1)
+
+        profile = np.where(
+            has,
+            means,
+            np.where(weight > 0, weighted / np.where(weight > 0, weight, 1.0), 3.0)
+        )
+        return profile, has
+
+
+# Singleton instance
+_energy_analytics_service = None
+
+def get_energy_analytics_service() -> EnergyAnalyticsService:
+    """Get or create the energy analytics service singleton."""
+    global _energy_analytics_service
+    if _energy_analytics_service is None:
+        _energy_analytics_service = EnergyAnalyticsService()
+    return _energy_analytics_service
+
+
+if __name__ == "__main__":
+    # python -m services.energy_analytics_service  (from backend/)
+    from database import init_db
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_db()
+    print(get_energy_analytics_service().run_until_complete())
@@ -1,7 +1,15 @@
 import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from collections import defaultdict
+import struct
+import logging
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from sqlalchemy import select, delete, update, extract, func, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_settings
+from models import EnergyEntry, EnergyHourlyAggregate, EnergyWeeklyProfile, EnergyAnalysis
+from storage import UPSERT_INSERTS
+
+logger = logging.getLogger(__name__)
 
 class EnergyService:
     """
@@ -9,6 +17,25 @@ class EnergyService:
     
     Tracks user energy levels throughout the day and provides
     recommendations for task timing based on energy patterns.
+    Readings are stored as rows in energy_entries (append-only), with a
+    24-bucket aggregate per user updated in the same transaction, so
+    analysis never scans the history.
+    
+    Each bucket holds the plain (total, count) and a time-decayed average:
+    a reading's weight halves every ENERGY_HALF_LIFE_DAYS. Only the bucket's
+    decayed sum, weight and last update time are stored, so a new reading
+    is folded in with O(1) work; recommendations use the decayed averages.
+    
+    A weekly profile (day of week x hour, 168 buckets) is kept per user as
+    one packed array, also updated with each reading. Empty buckets are
+    smoothed from neighboring hours and days when the profile is read. These
+    estimates only predict the current hour when it has no readings; peak,
+    low and best hours and task timing come from hours with readings.
+    
+    Analyses are precomputed for all users by a batch job
+    (EnergyAnalyticsService) into energy_analyses; get_analysis serves that
+    row and only computes the analysis on the fly for users without one.
+    A new reading deletes the user's row, so it is never out of date.
     """
     
     # Energy level labels
@@ -18,65 +45,412 @@ class EnergyService:
         (1, 2): "low"
     }
     
+    # Readings per user re-read at a time when rebuilding aggregates
+    REBUILD_CHUNK_USERS = 500
+    
+    DAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+    WEEK_BUCKETS = 7 * 24
+    
+    # Weekly profile storage: 168 totals then 168 counts
+    WEEKLY_FORMAT = struct.Struct(f"<{2 * WEEK_BUCKETS}I")
+    
+    # Precomputed analyses keep the day's unrounded hourly predictions for the current hour
+    HOURLY_FORMAT = struct.Struct("<24d")
+    
+    # Hours recommended for the next day, best first
+    NEXT_DAY_BEST_HOURS = 3
+    
+    # Smoothing of empty weekly buckets: (offset in hours, weight). +-1 and +-2
+    # hours wrap across midnight into the neighboring day; +-24 is the same
+    # hour on the previous/next day.
+    SMOOTHING_KERNEL = ((1, 1.0), (-1, 1.0), (2, 0.5), (-2, 0.5), (24, 0.5), (-24, 0.5))
+    
     def __init__(self):
-        pass
+        self.settings = get_settings()
+        # 0 disables decay (every reading weighs the same)
+        self.half_life_seconds = max(0.0, self.settings.ENERGY_HALF_LIFE_DAYS) * 24 * 60 * 60
+        self._empty_weekly = self.WEEKLY_FORMAT.pack(*([0] * 2 * self.WEEK_BUCKETS))
     
-    def parse_energy_log(self, energy_log_json: str) -> List[Dict[str, Any]]:
-        """Parse energy log from JSON string."""
-        try:
-            return json.loads(energy_log_json) if energy_log_json else []
-        except json.JSONDecodeError:
-            return []
+    async def add_energy_entry(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        energy_level: int
+    ) -> Dict[str, Any]:
+        """
+        Record a new energy reading.
+        
+        The reading is inserted and the hourly aggregate and weekly profile
+        updated in one transaction; the rows are locked while they are
+        updated, so concurrent readings can't overwrite each other. The
+        user's precomputed analysis is dropped in the same transaction.
+        """
+        entry = EnergyEntry(user_id=user_id, energy_level=energy_level, ts=datetime.now())
+        db.add(entry)
+        await self._update_hourly_aggregate(db, user_id, entry.ts, energy_level)
+        await self._update_weekly_profile(db, user_id, entry.ts, energy_level)
+        # The precomputed analysis no longer reflects the history
+        await db.execute(delete(EnergyAnalysis).where(EnergyAnalysis.user_id == user_id))
+        await db.commit()
+        return self.entry_to_dict(entry)
     
-    def add_energy_entry(self, energy_log_json: str, energy_level: int) -> str:
+    async def _update_hourly_aggregate(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        ts: datetime,
+        energy_level: int
+    ) -> None:
+        """Fold a reading into its hour bucket (call inside the reading's transaction)."""
+        table = EnergyHourlyAggregate.__table__
+        bucket = (table.c.user_id == user_id, table.c.hour == ts.hour)
+        
+        # The counter upsert creates the row if needed and holds its write lock
+        # until commit, so the decayed average below is updated without races
+        await self._increment_hourly_total(db, user_id, ts.hour, energy_level)
+        
+        row = (await db.execute(
+            select(table.c.ewma_sum, table.c.ewma_weight, table.c.ewma_ts).where(*bucket)
+        )).one()
+        ewma_sum, ewma_weight, ewma_ts = self._ewma_add(*row, energy_level, ts)
+        await db.execute(
+            update(table).where(*bucket)
+            .values(ewma_sum=ewma_sum, ewma_weight=ewma_weight, ewma_ts=ewma_ts)
+        )
+    
+    async def _increment_hourly_total(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        hour: int,
+        energy_level: int
+    ) -> None:
+        table = EnergyHourlyAggregate.__table__
+        upsert = UPSERT_INSERTS.get(db.bind.dialect.name)
+        if upsert is not None:
+            statement = upsert(table).values(user_id=user_id, hour=hour, total=energy_level, count=1)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.hour],
+                set_={
+                    "total": table.c.total + statement.excluded.total,
+                    "count": table.c.count + 1
+                }
+            ))
+            return
+        
+        result = await db.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.hour == hour)
+            .values(total=table.c.total + energy_level, count=table.c.count + 1)
+        )
+        if result.rowcount == 0:
+            await db.execute(table.insert().values(
+                user_id=user_id, hour=hour, total=energy_level, count=1
+            ))
+    
+    async def _update_weekly_profile(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        ts: datetime,
+        energy_level: int
+    ) -> None:
+        """Add a reading to the user's packed weekly profile (inside the reading's transaction)."""
+        table = EnergyWeeklyProfile.__table__
+        upsert = UPSERT_INSERTS.get(db.bind.dialect.name)
+        if upsert is not None:
+            # Make sure the row exists so it can be locked below
+            await db.execute(
+                upsert(table).values(user_id=user_id, buckets=self._empty_weekly)
+                .on_conflict_do_nothing(index_elements=[table.c.user_id])
+            )
+        
+        blob = (await db.execute(
+            select(table.c.buckets).where(table.c.user_id == user_id).with_for_update()
+        )).scalar_one_or_none()
+        totals, counts = self._unpack_weekly(blob)
+        bucket = ts.weekday() * 24 + ts.hour
+        totals[bucket] += energy_level
+        counts[bucket] += 1
+        
+        if blob is None:
+            await db.execute(table.insert().values(user_id=user_id, buckets=self._pack_weekly(totals, counts)))
+        else:
+            await db.execute(
+                update(table).where(table.c.user_id == user_id)
+                .values(buckets=self._pack_weekly(totals, counts))
+            )
+    
+    def _unpack_weekly(self, blob: Optional[bytes]) -> Tuple[List[int], List[int]]:
+        """Stored weekly profile -> (totals, counts), 168 each (zeros for no row)."""
+        values = self.WEEKLY_FORMAT.unpack(blob or self._empty_weekly)
+        return list(values[:self.WEEK_BUCKETS]), list(values[self.WEEK_BUCKETS:])
+    
+    def _pack_weekly(self, totals: List[int], counts: List[int]) -> bytes:
+        return self.WEEKLY_FORMAT.pack(*totals, *counts)
+    
+    async def get_weekly_buckets(self, db: AsyncSession, user_id: int) -> Tuple[List[int], List[int]]:
         """
-        Add a new energy entry to the log.
+        Day-of-week x hour (totals, counts) for a user, 168 each.
         
-        Returns updated log as JSON string.
+        Monday 00:00 first (index = weekday * 24 + hour); see
+        smooth_weekly_profile for the averages.
+        """
+        blob = (await db.execute(
+            select(EnergyWeeklyProfile.buckets).where(EnergyWeeklyProfile.user_id == user_id)
+        )).scalar_one_or_none()
+        return self._unpack_weekly(blob)
+    
+    def smooth_weekly_profile(self, totals: List[int], counts: List[int]) -> List[float]:
         """
-        log = self.parse_energy_log(energy_log_json)
+        Average each weekly bucket, filling empty ones from their neighbors.
         
+        An empty bucket takes the SMOOTHING_KERNEL-weighted mean of the
+        neighboring buckets (nearby hours, same hour on adjacent days) that
+        have readings. Without any it stays at the neutral 3.0: a user's
+        few readings say nothing about hours far from them.
+        """
+        size = self.WEEK_BUCKETS
+        means = [total / count if count else None for total, count in zip(totals, counts)]
+        
+        profile = []
+        for bucket, mean in enumerate(means):
+            if mean is not None:
+                profile.append(mean)
+                continue
+            weighted = weight = 0.0
+            for offset, kernel_weight in self.SMOOTHING_KERNEL:
+                neighbor = means[(bucket + offset) % size]
+                if neighbor is not None:
+                    weighted += kernel_weight * neighbor
+                    weight += kernel_weight
+            profile.append(weighted / weight if weight else 3.0)
+        
+        return profile
+    
+    async def get_energy_entries(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a user's readings, oldest first.
+        
+        With `limit`, only the most recent `limit` readings are returned.
+        """
+        query = select(EnergyEntry.energy_level, EnergyEntry.ts) \
+            .where(EnergyEntry.user_id == user_id) \
+            .order_by(EnergyEntry.ts.desc() if limit else EnergyEntry.ts)
+        if limit:
+            query = query.limit(limit)
+        rows = (await db.execute(query)).all()
+        if limit:
+            rows.reverse()
+        return [self.entry_to_dict(row) for row in rows]
+    
+    async def get_hourly_stats(
+        self,
+        db: AsyncSession,
+        user_id: int
+    ) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """
+        Plain and time-decayed hourly averages for a user.
+        
+        Reads the (at most 24) aggregate rows; returns (averages, decayed).
+        """
+        table = EnergyHourlyAggregate.__table__
+        rows = (await db.execute(
+            select(table.c.hour, table.c.total, table.c.count, table.c.ewma_sum, table.c.ewma_weight)
+            .where(table.c.user_id == user_id)
+        )).all()
+        return (
+            self.calculate_hourly_averages((hour, total, count) for hour, total, count, _, _ in rows),
+            self.calculate_hourly_averages((hour, s, w) for hour, _, _, s, w in rows)
+        )
+    
+    async def get_hourly_averages(self, db: AsyncSession, user_id: int) -> Dict[int, float]:
+        """Plain hourly averages for a user (every reading weighs the same)."""
+        return (await self.get_hourly_stats(db, user_id))[0]
+    
+    async def get_hourly_energy(self, db: AsyncSession, user_id: int) -> Dict[int, float]:
+        """Time-decayed hourly averages for a user, used for recommendations."""
+        return (await self.get_hourly_stats(db, user_id))[1]
+    
+    async def get_analysis(self, db: AsyncSession, user_id: int) -> Dict[str, Any]:
+        """
+        Full energy analysis for a user (see analyze_energy_patterns).
+        
+        Serves the row precomputed by the batch job today when there is one,
+        with the current-hour prediction filled in; otherwise analyzes the
+        aggregates now. Rows from an earlier day are not served: their
+        current-hour predictions and next_day were for that day.
+        `computed_at` is when the row was computed (None when computed now).
+        """
+        row = (await db.execute(
+            select(EnergyAnalysis.analysis, EnergyAnalysis.hourly_energy, EnergyAnalysis.computed_at)
+            .where(EnergyAnalysis.user_id == user_id)
+        )).one_or_none()
         now = datetime.now()
-        entry = {
-            "timestamp": now.isoformat(),
-            "energy_level": energy_level,
-            "hour": now.hour
-        }
         
-        log.append(entry)
+        if row is None or row.computed_at.date() != now.date():
+            hourly_averages, hourly_energy = await self.get_hourly_stats(db, user_id)
+            analysis = self.analyze_energy_patterns(
+                hourly_averages,
+                hourly_energy,
+                weekly_buckets=await self.get_weekly_buckets(db, user_id)
+            )
+            analysis["computed_at"] = None
+            return analysis
         
-        # Keep only last 100 entries to prevent bloat
-        if len(log) > 100:
-            log = log[-100:]
+        analysis = json.loads(row.analysis)
+        analysis.update(self.current_energy(dict(enumerate(self.HOURLY_FORMAT.unpack(row.hourly_energy))), now))
+        analysis["computed_at"] = row.computed_at.isoformat()
+        return analysis
+    
+    def _ewma_add(
+        self,
+        ewma_sum: float,
+        ewma_weight: float,
+        ewma_ts: Optional[datetime],
+        energy_level: int,
+        ts: datetime
+    ) -> Tuple[float, float, datetime]:
+        """
+        Fold one reading into a bucket's decayed (sum, weight) as of ewma_ts.
         
-        return json.dumps(log)
+        Decaying sum and weight by the same factor leaves their ratio (the
+        average) as it was, so only the reading's relative age matters.
+        """
+        if ewma_ts is None:
+            return float(energy_level), 1.0, ts
+        if ts >= ewma_ts:
+            decay = self._decay((ts - ewma_ts).total_seconds())
+            return ewma_sum * decay + energy_level, ewma_weight * decay + 1.0, ts
+        # Older than the bucket's latest reading: the reading itself is decayed
+        decay = self._decay((ewma_ts - ts).total_seconds())
+        return ewma_sum + energy_level * decay, ewma_weight + decay, ewma_ts
+    
+    def _decay(self, elapsed_seconds: float) -> float:
+        if not self.half_life_seconds:
+            return 1.0
+        return 0.5 ** (elapsed_seconds / self.half_life_seconds)
     
-    def calculate_hourly_averages(self, energy_log_json: str) -> Dict[int, float]:
+    def rebuild_aggregates(self, db, user_ids: Optional[Iterable[int]] = None) -> int:
         """
-        Calculate average energy level for each hour of the day.
+        Recompute hourly aggregates and weekly profiles from the raw readings.
         
-        Returns dict mapping hour (0-23) to average energy (1.0-5.0).
+        Works on a sync Session or Connection; the caller commits. Rebuilds
+        the given users, or everyone. Returns the number of hourly bucket
+        rows. Totals are recomputed in SQL; decayed averages and weekly
+        profiles by replaying each user's readings (current half-life).
+        Precomputed analyses of these users are dropped.
         """
-        log = self.parse_energy_log(energy_log_json)
+        table = EnergyHourlyAggregate.__table__
+        hour = extract("hour", EnergyEntry.ts)
+        totals = select(
+            EnergyEntry.user_id,
+            hour,
+            func.sum(EnergyEntry.energy_level),
+            func.count()
+        ).group_by(EnergyEntry.user_id, hour)
+        
+        weekly = EnergyWeeklyProfile.__table__
+        analyses = EnergyAnalysis.__table__
+        clear = delete(table)
+        clear_weekly = delete(weekly)
+        clear_analyses = delete(analyses)
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            clear = clear.where(table.c.user_id.in_(user_ids))
+            clear_weekly = clear_weekly.where(weekly.c.user_id.in_(user_ids))
+            clear_analyses = clear_analyses.where(analyses.c.user_id.in_(user_ids))
+            totals = totals.where(EnergyEntry.user_id.in_(user_ids))
+        
+        db.execute(clear)
+        db.execute(clear_weekly)
+        db.execute(clear_analyses)
+        result = db.execute(table.insert().from_select(
+            [table.c.user_id, table.c.hour, table.c.total, table.c.count],
+            totals
+        ))
         
-        if not log:
-            # Return default moderate energy if no data
-            return {h: 3.0 for h in range(24)}
+        if user_ids is None:
+            user_ids = db.execute(select(table.c.user_id).distinct()).scalars().all()
+        for start in range(0, len(user_ids), self.REBUILD_CHUNK_USERS):
+            self._replay_readings(db, user_ids[start:start + self.REBUILD_CHUNK_USERS])
         
-        # Group by hour
-        hourly_totals = defaultdict(list)
-        for entry in log:
-            hour = entry.get("hour", 12)
-            level = entry.get("energy_level", 3)
-            hourly_totals[hour].append(level)
+        return result.rowcount
+    
+    def _replay_readings(self, db, user_ids: List[int]) -> None:
+        """Rebuild decayed averages and weekly profiles for users whose rows were just reset."""
+        table = EnergyHourlyAggregate.__table__
+        readings = db.execute(
+            select(EnergyEntry.user_id, EnergyEntry.energy_level, EnergyEntry.ts)
+            .where(EnergyEntry.user_id.in_(user_ids))
+            .order_by(EnergyEntry.user_id, EnergyEntry.ts)
+        ).all()
+        
+        buckets: Dict[Tuple[int, int], Tuple[float, float, Optional[datetime]]] = {}
+        weekly: Dict[int, Tuple[List[int], List[int]]] = {}
+        for user_id, energy_level, ts in readings:
+            key = (user_id, ts.hour)
+            buckets[key] = self._ewma_add(*buckets.get(key, (0.0, 0.0, None)), energy_level, ts)
+            
+            if user_id not in weekly:
+                weekly[user_id] = self._unpack_weekly(None)
+            totals, counts = weekly[user_id]
+            bucket = ts.weekday() * 24 + ts.hour
+            totals[bucket] += energy_level
+            counts[bucket] += 1
+        
+        if weekly:
+            db.execute(EnergyWeeklyProfile.__table__.insert(), [
+                {"user_id": user_id, "buckets": self._pack_weekly(totals, counts)}
+                for user_id, (totals, counts) in weekly.items()
+            ])
+        
+        if buckets:
+            db.execute(
+                update(table)
+                .where(table.c.user_id == bindparam("b_user_id"), table.c.hour == bindparam("b_hour"))
+                .values(
+                    ewma_sum=bindparam("b_sum"),
+                    ewma_weight=bindparam("b_weight"),
+                    ewma_ts=bindparam("b_ts")
+                ),
+                [
+                    {"b_user_id": user_id, "b_hour": hour, "b_sum": s, "b_weight": w, "b_ts": ts}
+                    for (user_id, hour), (s, w, ts) in buckets.items()
+                ]
+            )
+    
+    def entry_to_dict(self, entry) -> Dict[str, Any]:
+        """Serialize a reading (EnergyEntry or row) in the legacy log entry format."""
+        return {
+            "timestamp": entry.ts.isoformat(),
+            "energy_level": entry.energy_level,
+            "hour": entry.ts.hour
+        }
+    
+    def calculate_hourly_averages(self, buckets: Iterable) -> Dict[int, float]:
+        """
+        Calculate average energy level for each hour of the day.
+        
+        Takes (hour, total, count) buckets, or (hour, decayed sum, weight).
+        Hours without readings get the neutral 3.0, so they are never peak
+        or low-energy hours.
+        Returns dict mapping hour (0-23) to average energy (1.0-5.0).
+        """
+        hourly_totals = {hour: (total, count) for hour, total, count in buckets if count}
         
         # Calculate averages
         hourly_averages = {}
         for hour in range(24):
             if hour in hourly_totals:
-                hourly_averages[hour] = sum(hourly_totals[hour]) / len(hourly_totals[hour])
+                total, count = hourly_totals[hour]
+                hourly_averages[hour] = total / count
             else:
-                # Interpolate or use default
                 hourly_averages[hour] = 3.0
         
         return hourly_averages
@@ -102,16 +476,55 @@ class EnergyService:
         else:
             return "low"
     
-    def analyze_energy_patterns(self, energy_log_json: str) -> Dict[str, Any]:
+    def analyze_energy_patterns(
+        self,
+        hourly_averages: Dict[int, float],
+        hourly_energy: Optional[Dict[int, float]] = None,
+        weekly_buckets: Optional[Tuple[List[int], List[int]]] = None
+    ) -> Dict[str, Any]:
         """
         Full energy analysis with patterns and recommendations.
+        
+        Takes the output of get_hourly_stats. Peaks, low hours and the
+        current prediction come from the time-decayed averages when given.
+        With the weekly buckets (get_weekly_buckets), the smoothed weekly
+        profile is included per day along with recommendations for
+        tomorrow, and predicts the current hour if it has no readings.
         """
-        hourly_averages = self.calculate_hourly_averages(energy_log_json)
-        peak_hours = self.identify_peak_hours(hourly_averages)
-        low_hours = self.identify_low_energy_hours(hourly_averages)
+        if hourly_energy is None:
+            hourly_energy = hourly_averages
+        peak_hours = self.identify_peak_hours(hourly_energy)
+        low_hours = self.identify_low_energy_hours(hourly_energy)
+        now = datetime.now()
+        
+        predictions = hourly_energy
+        if weekly_buckets is not None:
+            weekly_profile = self.smooth_weekly_profile(*weekly_buckets)
+            predictions = self.hourly_predictions(hourly_energy, weekly_profile, weekly_buckets[1], now.date())
+        
+        analysis = {
+            "hourly_averages": {str(k): round(v, 1) for k, v in hourly_averages.items()},
+            "hourly_energy": {str(k): round(v, 1) for k, v in hourly_energy.items()},
+            "peak_hours": peak_hours,
+            "low_energy_hours": low_hours,
+            "recommended_schedule": self.recommended_schedule(peak_hours, low_hours),
+            **self.current_energy(predictions, now)
+        }
+        
+        if weekly_buckets is not None:
+            analysis["weekly_profile"] = {
+                day: [round(v, 1) for v in weekly_profile[i * 24:(i + 1) * 24]]
+                for i, day in enumerate(self.DAY_NAMES)
+            }
+            analysis["next_day"] = self.next_day_recommendation(
+                weekly_profile, weekly_buckets[1], now.date() + timedelta(days=1)
+            )
         
-        # Create time block recommendations
-        schedule = {
+        return analysis
+    
+    def recommended_schedule(self, peak_hours: List[int], low_hours: List[int]) -> Dict[str, Any]:
+        """Time block recommendations by task complexity."""
+        return {
             "high_energy_tasks": {
                 "hours": peak_hours if peak_hours else [9, 10, 11],
                 "description": "Best for complex, demanding tasks"
@@ -125,21 +538,65 @@ class EnergyService:
                 "description": "Best for simple, automatic tasks"
             }
         }
-        
-        # Current recommendation
-        current_hour = datetime.now().hour
-        current_energy = hourly_averages.get(current_hour, 3.0)
-        
+    
+    def current_energy(self, hourly_energy: Dict[int, float], now: datetime) -> Dict[str, Any]:
+        """Predicted energy for the current hour."""
+        current_energy = hourly_energy.get(now.hour, 3.0)
         return {
-            "hourly_averages": {str(k): round(v, 1) for k, v in hourly_averages.items()},
-            "peak_hours": peak_hours,
-            "low_energy_hours": low_hours,
-            "recommended_schedule": schedule,
-            "current_hour": current_hour,
+            "current_hour": now.hour,
             "current_predicted_energy": round(current_energy, 1),
             "current_energy_label": self.get_energy_label(current_energy)
         }
     
+    def hourly_predictions(
+        self,
+        hourly_energy: Dict[int, float],
+        weekly_profile: List[float],
+        weekly_counts: List[int],
+        day: date
+    ) -> Dict[int, float]:
+        """
+        Predicted energy for each hour of `day`.
+        
+        Hours with readings keep their time-decayed average; the others take
+        the smoothed weekly profile's estimate for that day (3.0 when no
+        nearby hour has readings either).
+        """
+        estimates = self.profile_for_day(weekly_profile, day)
+        return {
+            hour: hourly_energy[hour] if any(weekly_counts[hour::24]) else estimates[hour]
+            for hour in range(24)
+        }
+    
+    def next_day_recommendation(
+        self,
+        weekly_profile: List[float],
+        weekly_counts: List[int],
+        day: date
+    ) -> Dict[str, Any]:
+        """
+        Peak, low and best hours for `day` from a weekly profile.
+        
+        Only hours with readings on that day of the week are considered, so
+        estimated buckets never make a recommendation. best_hours are the
+        NEXT_DAY_BEST_HOURS highest of them, earliest first on ties.
+        """
+        hours = self.profile_for_day(weekly_profile, day)
+        counts = self.profile_for_day(weekly_counts, day)
+        observed = [h for h in range(24) if counts[h]]
+        return {
+            "date": day.isoformat(),
+            "day": self.DAY_NAMES[day.weekday()],
+            "peak_hours": [h for h in observed if hours[h] >= 4.0],
+            "low_energy_hours": [h for h in observed if hours[h] <= 2.0],
+            "best_hours": sorted(observed, key=lambda h: -hours[h])[:self.NEXT_DAY_BEST_HOURS]
+        }
+    
+    def profile_for_day(self, weekly_profile: List[float], day: date) -> List[float]:
+        """The 24 hours of `day`'s weekday in a weekly profile (or its counts)."""
+        offset = day.weekday() * 24
+        return weekly_profile[offset:offset + 24]
+    
     def suggest_task_timing(
         self, 
         complexity_score: int, 
@@ -150,7 +607,7 @@ class EnergyService:
         
         Args:
             complexity_score: Task complexity (1-10)
-            hourly_averages: User's energy patterns
+            hourly_averages: User's energy patterns (get_hourly_energy)
             
         Returns:
             Timing suggestion with hours and reasoning
@@ -194,3 +651,23 @@ def get_energy_service() -> EnergyService:
     if _energy_service is None:
         _energy_service = EnergyService()
     return _energy_service
+
+
+if __name__ == "__main__":
+    # python -m services.energy_service [--user-id ID ...]  (from backend/)
+    import argparse
+    from database import init_db, SessionLocal
+    
+    parser = argparse.ArgumentParser(description="Rebuild energy aggregates and weekly profiles from raw readings")
+    parser.add_argument("--user-id", type=int, action="append", help="only rebuild these users")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_db()
+    db = SessionLocal()
+    try:
+        rows = get_energy_service().rebuild_aggregates(db, args.user_id)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Rebuilt {rows} hourly aggregate rows")
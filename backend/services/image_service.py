@@ -0,0 +1,89 @@
+import io
+import time
+import logging
+from typing import Tuple
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Pillow is optional: without it images are forwarded unchanged
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+class ImageService:
+    """
+    Service for preparing user photos before multimodal LLM calls.
+
+    Phone cameras produce multi-megabyte images far larger than the model
+    needs. Images are decoded once, rotated upright, downscaled to a max
+    dimension and re-encoded without EXIF metadata (which also drops GPS
+    location and device details).
+    """
+
+    FORMAT_MIME_TYPES = {
+        "JPEG": "image/jpeg",
+        "WEBP": "image/webp",
+    }
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.max_dimension = self.settings.IMAGE_MAX_DIMENSION
+        self.quality = self.settings.IMAGE_QUALITY
+        self.output_format = self.settings.IMAGE_FORMAT.upper()
+        if self.output_format not in self.FORMAT_MIME_TYPES:
+            self.output_format = "JPEG"
+
+    def preprocess(self, image_bytes: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """
+        Downscale and re-encode an image.
+
+        Returns (image_bytes, mime_type). If Pillow is missing or the image
+        can't be decoded, the original bytes are returned unchanged.
+        """
+        if not PIL_AVAILABLE:
+            return image_bytes, mime_type
+
+        start_time = time.time()
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                # Let the JPEG decoder scale down while decoding (no-op for other formats)
+                img.draft("RGB", (self.max_dimension, self.max_dimension))
+                # Apply the EXIF orientation before the metadata is dropped
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((self.max_dimension, self.max_dimension))
+
+                if self.output_format == "JPEG" and img.mode != "RGB":
+                    img = img.convert("RGB")
+
+                output = io.BytesIO()
+                # No exif= argument, so metadata is not copied to the output
+                img.save(output, format=self.output_format, quality=self.quality, optimize=True)
+                processed = output.getvalue()
+                size = img.size
+
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, sending original: {e}")
+            return image_bytes, mime_type
+
+        duration_ms = (time.time() - start_time) * 1000
+        logger.info(
+            f"Image preprocessed: {len(image_bytes)} -> {len(processed)} bytes, "
+            f"{size[0]}x{size[1]} {self.output_format}, {duration_ms:.1f}ms"
+        )
+
+        return processed, self.FORMAT_MIME_TYPES[self.output_format]
+
+
+# Singleton instance
+_image_service = None
+
+def get_image_service() -> ImageService:
+    """Get or create the image service singleton."""
+    global _image_service
+    if _image_service is None:
+        _image_service = ImageService()
+    return _image_service
@@ -1,12 +1,30 @@
 import json
 import re
+import copy
 import asyncio
 import time
 import base64
+import hashlib
+import logging
+import secrets
+import contextvars
 import httpx
-from typing import List, Dict, Any, Optional, Tuple
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple, Callable, AsyncIterator
 from config import get_settings
 from services.pii_masking_service import get_pii_masking_service
+from services.cache_service import TTLCache, SingleFlight
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.image_service import get_image_service
+
+logger = logging.getLogger(__name__)
+
+# Set inside half-open probe tasks so their calls bypass the open breaker
+_probing_provider: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "probing_provider", default=None
+)
 
 # Import logger for LLM calls
 try:
@@ -20,13 +38,83 @@ except ImportError:
 # Try to import google-genai SDK
 try:
     from google import genai
+    from google.genai import types as genai_types
     GENAI_AVAILABLE = True
 except ImportError:
     GENAI_AVAILABLE = False
 
+# HTTP/2 support for httpx is optional (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+class _StepStreamParser:
+    """
+    Incrementally extracts step objects from a streamed JSON array.
+    
+    Text is fed in arbitrary chunks; every time a top-level `{...}` object
+    closes it is parsed and returned, so steps can be emitted before the
+    model has finished the whole array.
+    """
+    
+    def __init__(self):
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of model output and return any completed steps."""
+        completed = []
+        for ch in text:
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._current = [ch]
+                continue
+            
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        step = json.loads("".join(self._current))
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(step, dict) and step.get("action"):
+                        completed.append(step)
+        return completed
+
+
 class LLMService:
     """Service for LLM-based task decomposition with privacy protection."""
     
+    # Bump whenever SYSTEM_PROMPT changes so cached decompositions are not reused
+    PROMPT_VERSION = 1
+    
+    # Model requested from the OpenAI-compatible endpoint
+    OPENAI_COMPAT_MODEL = "gpt-3.5-turbo"
+    
+    # Provider names, in the order decompose_task tries them
+    GEMINI = "gemini"
+    OPENAI_COMPAT = "openai_compatible"
+    
+    # Cheap goal used by half-open circuit breaker probes
+    PROBE_GOAL = "Drink a glass of water"
+    
     SYSTEM_PROMPT = """You are a neuro-inclusive executive function assistant.
 Break the goal into very small MicroWins.
 
@@ -53,6 +141,303 @@ No other text, just the JSON array."""
     def __init__(self):
         self.settings = get_settings()
         self.pii_service = get_pii_masking_service()
+        self.image_service = get_image_service()
+        self._cache = TTLCache(
+            max_entries=self.settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.settings.LLM_CACHE_TTL_SECONDS
+        ) if self.settings.LLM_CACHE_ENABLED else None
+        # Multimodal results: only the (small) masked steps are stored, bounded by
+        # total size, keyed on the image's content hash rather than the image itself
+        self._image_cache = TTLCache(
+            max_entries=self.settings.LLM_IMAGE_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.settings.LLM_CACHE_TTL_SECONDS,
+            max_bytes=self.settings.LLM_IMAGE_CACHE_MAX_BYTES,
+            size_of=lambda steps: len(json.dumps(steps))
+        ) if self.settings.LLM_CACHE_ENABLED else None
+        self._single_flight = SingleFlight()
+        
+        # Speculative decompositions started by analyze_task_for_image, keyed by
+        # single-use handoff token -> (goal, running decomposition)
+        self._handoffs = TTLCache(
+            max_entries=self.settings.LLM_HANDOFF_MAX_ENTRIES,
+            ttl_seconds=self.settings.LLM_HANDOFF_TTL_SECONDS
+        )
+        
+        # Long-lived pooled clients, opened/closed by the app lifespan
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._gemini_client = None
+        self._gemini_http: Optional[httpx.Client] = None
+        self._gemini_async_http: Optional[httpx.AsyncClient] = None
+        
+        # Per-worker cap on concurrent upstream LLM calls, plus a dedicated
+        # executor so unavoidable blocking work never touches the default pool
+        self._llm_slots = asyncio.Semaphore(self.settings.LLM_MAX_IN_FLIGHT)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        # Per-provider health tracking; open breakers are skipped with zero wait
+        self._breakers = {
+            provider: CircuitBreaker(
+                provider,
+                failure_rate_threshold=self.settings.LLM_BREAKER_FAILURE_RATE,
+                window_size=self.settings.LLM_BREAKER_WINDOW,
+                min_calls=self.settings.LLM_BREAKER_MIN_CALLS,
+                slow_call_seconds=self.settings.LLM_BREAKER_SLOW_MS / 1000,
+                cooldown_seconds=self.settings.LLM_BREAKER_COOLDOWN_SECONDS
+            )
+            for provider in (self.GEMINI, self.OPENAI_COMPAT)
+        }
+        self._probes = set()
+    
+    # ==================== Client Lifecycle ====================
+    
+    def _http_client_args(self, timeout: float) -> Dict[str, Any]:
+        """Shared keep-alive pool configuration for LLM HTTP clients."""
+        return {
+            "timeout": timeout,
+            "http2": self.settings.LLM_HTTP2 and H2_AVAILABLE,
+            "limits": httpx.Limits(
+                max_connections=self.settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=self.settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=self.settings.LLM_HTTP_KEEPALIVE_EXPIRY
+            )
+        }
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the pooled client for the OpenAI-compatible endpoint."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                **self._http_client_args(self.settings.LLM_HTTP_TIMEOUT)
+            )
+        return self._http_client
+    
+    def _get_gemini_client(self):
+        """Get the Gemini client, backed by our own pooled httpx clients."""
+        if self._gemini_client is None:
+            client_args = self._http_client_args(self.settings.GEMINI_HTTP_TIMEOUT)
+            self._gemini_http = httpx.Client(**client_args)
+            self._gemini_async_http = httpx.AsyncClient(**client_args)
+            self._gemini_client = genai.Client(
+                api_key=self.settings.GEMINI_API_KEY,
+                http_options=genai_types.HttpOptions(
+                    httpx_client=self._gemini_http,
+                    httpx_async_client=self._gemini_async_http
+                )
+            )
+        return self._gemini_client
+    
+    # ==================== Provider Health ====================
+    
+    def _provider_configured(self, provider: str) -> bool:
+        if provider == self.GEMINI:
+            return bool(self.settings.GEMINI_API_KEY) and GENAI_AVAILABLE
+        return bool(self.settings.LLM_API_URL and self.settings.LLM_API_KEY)
+    
+    def _provider_available(self, provider: str) -> bool:
+        """
+        Whether a live request should call this provider now.
+        
+        An open breaker answers immediately with False and, once its cooldown
+        has passed, kicks off a background half-open probe.
+        """
+        if not self._provider_configured(provider):
+            return False
+        
+        breaker = self._breakers[provider]
+        if breaker.allow_request():
+            return True
+        
+        if breaker.try_start_probe():
+            job = asyncio.create_task(self._probe(provider))
+            self._probes.add(job)
+            job.add_done_callback(self._probes.discard)
+        return False
+    
+    async def _probe(self, provider: str) -> None:
+        """Half-open probe: one cheap call decides whether the breaker closes."""
+        _probing_provider.set(provider)
+        try:
+            if provider == self.GEMINI:
+                await self._call_gemini(self.PROBE_GOAL)
+            else:
+                await self._call_llm(self.PROBE_GOAL)
+        except Exception as e:
+            logger.info(f"Circuit probe for '{provider}' failed: {e}")
+        finally:
+            breaker = self._breakers[provider]
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                # Probe never reached the provider; stay open for another cooldown
+                breaker.record_failure(0.0)
+    
+    @asynccontextmanager
+    async def _upstream(self, provider: str):
+        """
+        Guard one upstream call: refuse it if the breaker is open, bound
+        concurrency, and record the outcome and latency on the breaker.
+        
+        Yields a function a streaming call invokes as chunks arrive, so its
+        latency is measured to the first chunk rather than the whole stream.
+        """
+        breaker = self._breakers[provider]
+        if not breaker.allow_request() and _probing_provider.get() != provider:
+            raise CircuitOpenError(f"{provider} circuit is {breaker.state}")
+        
+        async with self._llm_slots:
+            start = time.monotonic()
+            first_chunk_at = None
+            
+            def received_chunk() -> None:
+                nonlocal first_chunk_at
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+            
+            try:
+                yield received_chunk
+            except Exception:
+                breaker.record_failure(time.monotonic() - start)
+                raise
+            breaker.record_success((first_chunk_at or time.monotonic()) - start)
+    
+    async def _stream_upstream(
+        self, provider: str, read_chunks: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """
+        Yield the text chunks of an upstream stream, read by a task of its own.
+        
+        The reader doesn't wait for the consumer, so the concurrency slot is
+        released and the outcome recorded when the provider finishes, however
+        slowly the client reads. Closing the generator early cancels the read.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        
+        async def read() -> None:
+            try:
+                async with self._upstream(provider) as received_chunk:
+                    async for text in read_chunks():
+                        received_chunk()
+                        chunks.put_nowait(text)
+            finally:
+                chunks.put_nowait(finished)
+        
+        reader = asyncio.create_task(read())
+        try:
+            while (text := await chunks.get()) is not finished:
+                yield text
+            await reader  # Re-raises the upstream's error, if any
+        finally:
+            if not reader.done():
+                reader.cancel()
+                await asyncio.wait({reader})
+            if not reader.cancelled():
+                reader.exception()  # Retrieved so an abandoned failure isn't logged as unhandled
+    
+    def provider_health(self) -> Dict[str, Any]:
+        """Get circuit breaker state for each configured provider."""
+        return {
+            provider: breaker.snapshot()
+            for provider, breaker in self._breakers.items()
+            if self._provider_configured(provider)
+        }
+    
+    async def _gemini_generate(self, contents: Any):
+        """Call Gemini through the SDK's native async API, guarded by its breaker."""
+        client = self._get_gemini_client()
+        async with self._upstream(self.GEMINI):
+            return await client.aio.models.generate_content(
+                model=self.settings.GEMINI_MODEL,
+                contents=contents
+            )
+    
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run unavoidable synchronous work on the dedicated LLM executor."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.settings.LLM_EXECUTOR_WORKERS,
+                thread_name_prefix="llm"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+    
+    async def open_clients(self) -> None:
+        """Create the pooled LLM clients up front so the first request skips setup."""
+        if self.settings.GEMINI_API_KEY and GENAI_AVAILABLE:
+            self._get_gemini_client()
+        if self.settings.LLM_API_URL and self.settings.LLM_API_KEY:
+            self._get_http_client()
+    
+    async def close_clients(self) -> None:
+        """Close pooled LLM clients and their keep-alive connections."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        
+        if self._gemini_client is not None:
+            await self._gemini_async_http.aclose()
+            self._gemini_http.close()
+            self._gemini_client = None
+            self._gemini_http = None
+            self._gemini_async_http = None
+        
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _active_model(self) -> Optional[str]:
+        """Name of the model decompose_task would call, or None if no LLM is configured."""
+        if self.settings.GEMINI_API_KEY:
+            return self.settings.GEMINI_MODEL
+        if self.settings.LLM_API_URL and self.settings.LLM_API_KEY:
+            return self.OPENAI_COMPAT_MODEL
+        return None
+    
+    def _provider_model(self, provider: str) -> str:
+        """Model name a provider's answers are cached under."""
+        return self.settings.GEMINI_MODEL if provider == self.GEMINI else self.OPENAI_COMPAT_MODEL
+    
+    def _cache_models(self) -> List[str]:
+        """
+        Models whose cached answers may be served now, best first.
+        
+        Configured providers in call order, up to the first one whose breaker
+        accepts calls: a fallback provider's answers are only served while
+        the providers before it are down.
+        """
+        models = []
+        for provider in (self.GEMINI, self.OPENAI_COMPAT):
+            if self._provider_configured(provider):
+                models.append(self._provider_model(provider))
+                if self._breakers[provider].allow_request():
+                    break
+        return models
+    
+    def _cache_lookup(self, masked_goal: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached steps for a goal from one of _cache_models(), or None."""
+        if self._cache is None:
+            return None
+        for model in self._cache_models():
+            steps = self._cache.get(self._cache_key(masked_goal, model))
+            if steps is not None:
+                return steps
+        return None
+    
+    def _cache_key(self, masked_goal: str, model: str) -> Tuple[str, int, str]:
+        """
+        Build the decomposition cache key.
+        
+        Uses the PII-masked goal with whitespace collapsed and case folded,
+        so "Clean my  room" and "clean my room" share an entry.
+        """
+        normalized = " ".join(masked_goal.split()).casefold()
+        return (model, self.PROMPT_VERSION, normalized)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get decomposition cache and in-flight coalescing statistics."""
+        stats = {"enabled": self._cache is not None, "single_flight": self._single_flight.stats()}
+        if self._cache is not None:
+            stats.update(self._cache.stats())
+        if self._image_cache is not None:
+            stats["image"] = self._image_cache.stats()
+        return stats
     
     def _calculate_complexity(self, goal: str, steps: List[Dict]) -> int:
         """
@@ -204,33 +589,55 @@ No other text, just the JSON array."""
         """
         # Step 1: Mask PII
         masked_goal, pii_map = self.pii_service.mask_text(goal)
-        
+        return await self._decompose_masked(goal, masked_goal, pii_map)
+    
+    async def _decompose_masked(
+        self,
+        goal: str,
+        masked_goal: str,
+        pii_map: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """decompose_task for a goal whose PII has already been masked."""
         steps = []
+        source = "fallback"
         
-        # Step 2: Try Gemini first, then OpenAI-compatible, then fallback
-        if self.settings.GEMINI_API_KEY:
-            try:
-                steps = await self._call_gemini(masked_goal)
-            except Exception as e:
-                print(f"Gemini call failed: {e}, trying fallback")
-                steps = []
-        elif self.settings.LLM_API_URL and self.settings.LLM_API_KEY:
-            try:
-                steps = await self._call_llm(masked_goal)
-            except Exception as e:
-                print(f"LLM call failed: {e}, using fallback")
-                steps = []
+        # Step 2: Serve repeated goals from cache, otherwise call the LLM once
+        # per distinct goal (concurrent identical requests share the call)
+        models = self._cache_models()
+        if models:
+            cached_steps = self._cache_lookup(masked_goal)
+            source = "cache"
+            
+            if cached_steps is None:
+                cached_steps = await self._single_flight.do(
+                    ("decompose",) + self._cache_key(masked_goal, models[0]),
+                    lambda: self._fetch_llm_steps(masked_goal)
+                )
+                source = "llm"
+            
+            # Copy so unmasking below never mutates a shared/cached result
+            steps = copy.deepcopy(cached_steps)
         
         # Step 3: Use fallback if LLM not available or failed
         if not steps:
             steps = self._generate_fallback_steps(masked_goal)
+            source = "fallback"
         
-        # Step 4: Calculate complexity
+        return self._build_result(goal, steps, pii_map, source)
+    
+    def _build_result(
+        self,
+        goal: str,
+        steps: List[Dict[str, Any]],
+        pii_map: Dict[str, str],
+        source: str
+    ) -> Dict[str, Any]:
+        """Score, unmask and bound decomposed steps into the service result."""
+        # Calculate complexity
         complexity = self._calculate_complexity(goal, steps)
         
-        # Step 5: Unmask any PII in steps (shouldn't be any, but safety check)
-        for step in steps:
-            step['action'] = self.pii_service.unmask_text(step['action'], pii_map)
+        # Unmask any PII in steps (shouldn't be any, but safety check)
+        self.pii_service.unmask_steps(steps, pii_map)
         
         # Ensure we have at least 2 and at most 10 steps
         steps = steps[:10] if len(steps) > 10 else steps
@@ -239,13 +646,274 @@ No other text, just the JSON array."""
             "steps": steps,  # Return all steps (LLM decides count based on task)
             "total_steps": len(steps),
             "all_steps": steps,
-            "complexity_score": complexity
+            "complexity_score": complexity,
+            "source": source  # "llm", "cache" or "fallback"
         }
     
+    async def decompose_many(self, goals: List[str], concurrency: int) -> List[Any]:
+        """
+        Decompose several goals concurrently, at most `concurrency` at a time.
+        
+        Returns one entry per goal in input order: the decompose_task result,
+        or the exception raised for that goal.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+        
+        # Mask the whole batch up front, off the event loop
+        masked = await self._run_blocking(self.pii_service.mask_many, goals)
+        
+        async def run_one(goal: str, masked_goal: str, pii_map: Dict[str, str]) -> Dict[str, Any]:
+            async with slots:
+                return await self._decompose_masked(goal, masked_goal, pii_map)
+        
+        return await asyncio.gather(
+            *(run_one(goal, masked_goal, pii_map) for goal, (masked_goal, pii_map) in zip(goals, masked)),
+            return_exceptions=True
+        )
+    
+    async def decompose_task_within(
+        self,
+        goal: str,
+        deadline_seconds: float,
+        handoff_token: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], Optional["asyncio.Task"]]:
+        """
+        Decompose a goal without waiting on the LLM past a deadline.
+        
+        Returns (result, pending). If the LLM answers in time, pending is None.
+        Otherwise result holds the rule-based fallback steps and pending is the
+        still-running decomposition, whose result can replace them later.
+        A valid handoff_token from analyze_task_for_image reuses the
+        decomposition that was started speculatively for the same goal.
+        """
+        llm_call = self.claim_handoff(handoff_token, goal) if handoff_token else None
+        if llm_call is None:
+            llm_call = asyncio.ensure_future(self.decompose_task(goal))
+        if deadline_seconds <= 0:
+            return await llm_call, None
+        
+        done, _ = await asyncio.wait({llm_call}, timeout=deadline_seconds)
+        if done:
+            return llm_call.result(), None
+        
+        masked_goal, pii_map = self.pii_service.mask_text(goal)
+        fallback_steps = self._generate_fallback_steps(masked_goal)
+        return self._build_result(goal, fallback_steps, pii_map, "fallback"), llm_call
+    
+    async def decompose_task_stream(self, goal: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Decompose a goal, yielding micro-steps as the LLM generates them.
+        
+        Yields {"event": "step", "step": {...}} for each step, then a final
+        {"event": "done", ...} carrying the same fields as decompose_task.
+        Cached goals are replayed immediately; if a provider fails before
+        producing any step the next one is tried, then the rule-based
+        fallback steps are streamed instead.
+        If it fails after some steps were sent, "done" has partial=True and
+        the steps are not cached.
+        """
+        masked_goal, pii_map = self.pii_service.mask_text(goal)
+        cached_steps = self._cache_lookup(masked_goal)
+        
+        steps = []
+        completed = False  # The stream ended (or reached 10 steps) rather than failing
+        if cached_steps is not None:
+            for step in self.pii_service.unmask_steps(copy.deepcopy(cached_steps), pii_map):
+                steps.append(step)
+                yield {"event": "step", "step": step}
+            completed = True
+        
+        # As in _fetch_llm_steps, a provider that fails (or produces nothing)
+        # falls through to the next one, but only before any step was sent
+        providers = () if cached_steps is not None else (
+            (self.GEMINI, self._stream_gemini),
+            (self.OPENAI_COMPAT, self._stream_llm)
+        )
+        for provider, stream_steps in providers:
+            if not self._provider_available(provider):
+                continue
+            
+            masked_steps = []
+            completed = False
+            masked_stream = stream_steps(masked_goal)
+            try:
+                async for step in masked_stream:
+                    masked_steps.append(copy.deepcopy(step))
+                    step.setdefault("step_number", len(steps) + 1)
+                    step['action'] = self.pii_service.unmask_text(step['action'], pii_map)
+                    steps.append(step)
+                    yield {"event": "step", "step": step}
+                    if len(steps) >= 10:
+                        break
+                completed = True
+            except Exception as e:
+                logger.warning(f"Streaming {provider} call failed after {len(steps)} steps: {e}")
+            finally:
+                await masked_stream.aclose()
+            
+            if steps:
+                # Only cache complete answers, under the model that gave them
+                if completed and self._cache is not None:
+                    self._cache.set(self._cache_key(masked_goal, self._provider_model(provider)), masked_steps)
+                break
+        
+        # Fallback if LLM not available or failed before the first step
+        partial = bool(steps) and not completed
+        if not steps:
+            steps = self.pii_service.unmask_steps(self._generate_fallback_steps(masked_goal), pii_map)
+            for step in steps:
+                yield {"event": "step", "step": step}
+        
+        yield {
+            "event": "done",
+            "steps": steps,
+            "total_steps": len(steps),
+            "all_steps": steps,
+            "complexity_score": self._calculate_complexity(goal, steps),
+            "partial": partial
+        }
+    
+    async def _stream_gemini(self, goal: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream steps from Gemini using generate_content_stream."""
+        prompt = f"""{self.SYSTEM_PROMPT}
+
+Break down this goal: {goal}"""
+        
+        parser = _StepStreamParser()
+        content = []
+        start_time = time.time()
+        client = self._get_gemini_client()
+        
+        async def read_chunks() -> AsyncIterator[str]:
+            stream = await client.aio.models.generate_content_stream(
+                model=self.settings.GEMINI_MODEL,
+                contents=prompt
+            )
+            async for chunk in stream:
+                yield chunk.text or ""
+        
+        chunks = self._stream_upstream(self.GEMINI, read_chunks)
+        try:
+            async for text in chunks:
+                content.append(text)
+                for step in parser.feed(text):
+                    yield step
+        finally:
+            await chunks.aclose()
+        
+        if LOGGER_AVAILABLE and self.settings.DEBUG:
+            duration_ms = (time.time() - start_time) * 1000
+            log_entry = [
+                "[LLM CALL] Gemini API (stream)",
+                f"Model: {self.settings.GEMINI_MODEL}",
+                f"Duration: {duration_ms:.2f}ms",
+                f"Prompt:\n{prompt}",
+                f"Response:\n{''.join(content)}"
+            ]
+            log_to_file("\n".join(log_entry))
+    
+    async def _stream_llm(self, goal: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream steps from the OpenAI-compatible API (server-sent deltas)."""
+        request_payload = {
+            "model": self.OPENAI_COMPAT_MODEL,
+            "messages": [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": f"Break down this goal: {goal}"}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 500,
+            "stream": True
+        }
+        
+        parser = _StepStreamParser()
+        content = []
+        start_time = time.time()
+        client = self._get_http_client()
+        
+        async def read_chunks() -> AsyncIterator[str]:
+            async with client.stream(
+                "POST",
+                self.settings.LLM_API_URL,
+                headers={
+                    "Authorization": f"Bearer {self.settings.LLM_API_KEY}",
+                    "Content-Type": "application/json"
+                },
+                json=request_payload
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {})
+                    except (json.JSONDecodeError, KeyError, IndexError):
+                        continue
+                    yield delta.get("content") or ""
+        
+        chunks = self._stream_upstream(self.OPENAI_COMPAT, read_chunks)
+        try:
+            async for text in chunks:
+                content.append(text)
+                for step in parser.feed(text):
+                    yield step
+        finally:
+            await chunks.aclose()
+        
+        if LOGGER_AVAILABLE and self.settings.DEBUG:
+            duration_ms = (time.time() - start_time) * 1000
+            log_entry = [
+                "[LLM CALL] OpenAI-compatible API (stream)",
+                f"URL: {self.settings.LLM_API_URL}",
+                f"Duration: {duration_ms:.2f}ms",
+                f"Request:\n{json.dumps(request_payload, indent=2)}",
+                f"Response:\n{''.join(content)}"
+            ]
+            log_to_file("\n".join(log_entry))
+    
+    async def _fetch_llm_steps(self, masked_goal: str) -> List[Dict[str, Any]]:
+        """
+        Call Gemini first, then OpenAI-compatible, and cache a successful answer.
+        
+        Providers whose circuit breaker is open are skipped without waiting.
+        The answer is cached under the model of the provider that gave it.
+        Returns an empty list when every provider fails so the caller can
+        fall back to rule-based steps.
+        """
+        steps = []
+        provider = None
+        
+        if self._provider_available(self.GEMINI):
+            provider = self.GEMINI
+            try:
+                steps = await self._call_gemini(masked_goal)
+            except Exception as e:
+                logger.warning(f"Gemini call failed: {e}, trying next provider")
+                steps = []
+        
+        if not steps and self._provider_available(self.OPENAI_COMPAT):
+            provider = self.OPENAI_COMPAT
+            try:
+                steps = await self._call_llm(masked_goal)
+            except Exception as e:
+                logger.warning(f"LLM call failed: {e}, using fallback")
+                steps = []
+        
+        # Only cache real LLM answers, never the rule-based fallback
+        if steps and self._cache is not None:
+            self._cache.set(
+                self._cache_key(masked_goal, self._provider_model(provider)),
+                copy.deepcopy(steps)
+            )
+        
+        return steps
+    
     async def _call_gemini(self, goal: str) -> List[Dict[str, Any]]:
         """Call Gemini API using the official SDK."""
         if not GENAI_AVAILABLE:
-            print("google-genai SDK not installed, using fallback")
+            logger.warning("google-genai SDK not installed, using fallback")
             return []
         
         prompt = f"""{self.SYSTEM_PROMPT}
@@ -254,18 +922,7 @@ Break down this goal: {goal}"""
         
         start_time = time.time()
         try:
-            # Create client with API key
-            client = genai.Client(api_key=self.settings.GEMINI_API_KEY)
-            
-            # Run sync call in executor to not block async loop
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.models.generate_content(
-                    model=self.settings.GEMINI_MODEL,
-                    contents=prompt
-                )
-            )
+            response = await self._gemini_generate(prompt)
             
             # Extract text from response
             content = response.text
@@ -290,7 +947,7 @@ Break down this goal: {goal}"""
             
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
-            print(f"Gemini SDK error: {e}")
+            logger.warning(f"Gemini SDK error: {e}")
             
             # Log the error
             if LOGGER_AVAILABLE and self.settings.DEBUG:
@@ -308,7 +965,7 @@ Break down this goal: {goal}"""
     async def _call_llm(self, goal: str) -> List[Dict[str, Any]]:
         """Call external OpenAI-compatible LLM API with masked goal."""
         request_payload = {
-            "model": "gpt-3.5-turbo",
+            "model": self.OPENAI_COMPAT_MODEL,
             "messages": [
                 {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": f"Break down this goal: {goal}"}
@@ -318,7 +975,8 @@ Break down this goal: {goal}"""
         }
         
         start_time = time.time()
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        client = self._get_http_client()
+        async with self._upstream(self.OPENAI_COMPAT):
             response = await client.post(
                 self.settings.LLM_API_URL,
                 headers={
@@ -327,33 +985,37 @@ Break down this goal: {goal}"""
                 },
                 json=request_payload
             )
+            # Every error status counts against the provider's health: besides
+            # server errors and throttling, a 401/403 (revoked key) or 404 (wrong
+            # model name) fails every call until the configuration is fixed
+            response.raise_for_status()
+        
+        duration_ms = (time.time() - start_time) * 1000
+        response_text = response.text
+        
+        # Log the LLM call
+        if LOGGER_AVAILABLE and self.settings.DEBUG:
+            log_entry = [
+                "[LLM CALL] OpenAI-compatible API",
+                f"URL: {self.settings.LLM_API_URL}",
+                f"Status: {response.status_code}",
+                f"Duration: {duration_ms:.2f}ms",
+                f"Request:\n{json.dumps(request_payload, indent=2)}",
+                f"Response:\n{response_text}"
+            ]
+            log_to_file("\n".join(log_entry))
+            print(f"📝 Logged LLM call: OpenAI-compatible ({duration_ms:.2f}ms)")
+        
+        if response.status_code == 200:
+            data = response.json()
+            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
             
-            duration_ms = (time.time() - start_time) * 1000
-            response_text = response.text
-            
-            # Log the LLM call
-            if LOGGER_AVAILABLE and self.settings.DEBUG:
-                log_entry = [
-                    "[LLM CALL] OpenAI-compatible API",
-                    f"URL: {self.settings.LLM_API_URL}",
-                    f"Status: {response.status_code}",
-                    f"Duration: {duration_ms:.2f}ms",
-                    f"Request:\n{json.dumps(request_payload, indent=2)}",
-                    f"Response:\n{response_text}"
-                ]
-                log_to_file("\n".join(log_entry))
-                print(f"📝 Logged LLM call: OpenAI-compatible ({duration_ms:.2f}ms)")
-            
-            if response.status_code == 200:
-                data = response.json()
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                
-                # Parse JSON from response
-                json_match = re.search(r'\[.*\]', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-            
-            return []
+            # Parse JSON from response
+            json_match = re.search(r'\[.*\]', content, re.DOTALL)
+            if json_match:
+                return json.loads(json_match.group())
+        
+        return []
 
 
     # ==================== Image Context Methods ====================
@@ -388,27 +1050,71 @@ No other text, just the JSON object."""
         """
         Analyze if a task would benefit from image context.
         Returns whether an image is needed and a prompt to ask the user.
+        
+        When no image is needed, the text-only decomposition is started right
+        away and the result includes a short-lived handoff_token that lets the
+        following decompose call pick up that work instead of starting over.
+        It is not started before the analysis is known: a goal that needs an
+        image is decomposed with it, so the text-only call would be wasted.
         """
-        if not self.settings.GEMINI_API_KEY or not GENAI_AVAILABLE:
+        result = await self._analyze_task_for_image(goal)
+        
+        if self._active_model() and not result["needs_image"]:
+            speculative = asyncio.ensure_future(self.decompose_task(goal))
+            # Never leave an unretrieved exception if nobody claims the result
+            speculative.add_done_callback(lambda t: t.cancelled() or t.exception())
+            
+            token = secrets.token_urlsafe(16)
+            self._handoffs.set(token, (goal, speculative))
+            result["handoff_token"] = token
+        return result
+    
+    def claim_handoff(self, token: str, goal: str) -> Optional["asyncio.Task"]:
+        """
+        Take the speculative decomposition registered under a handoff token.
+        
+        Tokens are single use and only valid for the exact goal they were
+        issued for (and only in the worker process that issued them).
+        """
+        entry = self._handoffs.get(token)
+        if entry is None:
+            return None
+        self._handoffs.delete(token)
+        
+        handoff_goal, speculative = entry
+        return speculative if handoff_goal == goal else None
+    
+    async def _analyze_task_for_image(self, goal: str) -> Dict[str, Any]:
+        """Ask Gemini (or the keyword fallback) whether an image would help."""
+        if not self._provider_available(self.GEMINI):
             # Fallback: simple keyword-based detection
             return self._fallback_image_analysis(goal)
         
+        # Mask PII so it never reaches the LLM; identical masked goals share one call
+        masked_goal, pii_map = self.pii_service.mask_text(goal)
+        request_key = ("analyze",) + self._cache_key(masked_goal, self.settings.GEMINI_MODEL)
+        result = await self._single_flight.do(
+            request_key,
+            lambda: self._call_gemini_image_analysis(masked_goal)
+        )
+        
+        if result is None:
+            return self._fallback_image_analysis(goal)
+        
+        result = dict(result)
+        if result.get("image_prompt"):
+            result["image_prompt"] = self.pii_service.unmask_text(result["image_prompt"], pii_map)
+        return result
+    
+    async def _call_gemini_image_analysis(self, goal: str) -> Optional[Dict[str, Any]]:
+        """Ask Gemini whether an image would help. Returns None on failure."""
         prompt = f"""{self.IMAGE_ANALYSIS_PROMPT}
 
 User's task: {goal}"""
         
         start_time = time.time()
         try:
-            client = genai.Client(api_key=self.settings.GEMINI_API_KEY)
-            
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.models.generate_content(
-                    model=self.settings.GEMINI_MODEL,
-                    contents=prompt
-                )
-            )
+            response = await self._gemini_generate(prompt)
             
             content = response.text
             duration_ms = (time.time() - start_time) * 1000
@@ -436,11 +1142,11 @@ User's task: {goal}"""
                 }
                 
         except Exception as e:
-            print(f"Image analysis error: {e}")
+            logger.warning(f"Image analysis error: {e}")
             if LOGGER_AVAILABLE and self.settings.DEBUG:
                 log_to_file(f"[LLM ERROR] Image Analysis: {str(e)}")
         
-        return self._fallback_image_analysis(goal)
+        return None
     
     def _fallback_image_analysis(self, goal: str) -> Dict[str, Any]:
         """Fallback keyword-based image analysis."""
@@ -492,13 +1198,81 @@ User's task: {goal}"""
         """
         Decompose a task with image context using Gemini's multimodal capabilities.
         """
-        if not self.settings.GEMINI_API_KEY or not GENAI_AVAILABLE:
-            # Fall back to text-only decomposition
+        try:
+            image_bytes = base64.b64decode(image_base64, validate=True)
+        except ValueError as e:
+            logger.warning(f"Invalid image data: {e}")
             return await self.decompose_task(goal)
         
+        return await self.decompose_task_with_image_bytes(goal, image_bytes, mime_type)
+    
+    async def decompose_task_with_image_bytes(
+        self,
+        goal: str,
+        image_bytes: bytes,
+        mime_type: str = "image/jpeg"
+    ) -> Dict[str, Any]:
+        """
+        Decompose a task with raw image bytes as context.
+        
+        Results are cached on a hash of the image bytes plus the masked goal,
+        so resubmitting the same photo skips the multimodal call. On a miss
+        the image is downscaled and re-encoded (EXIF stripped) on the
+        dedicated LLM executor before it is sent to Gemini.
+        """
         # Mask PII in goal
         masked_goal, pii_map = self.pii_service.mask_text(goal)
         
+        request_key = None
+        if self._image_cache is not None:
+            digest = await self._run_blocking(self._image_digest, image_bytes)
+            request_key = (digest,) + self._cache_key(masked_goal, self.settings.GEMINI_MODEL)
+            cached_steps = self._image_cache.get(request_key)
+            if cached_steps is not None:
+                return self._build_result(goal, copy.deepcopy(cached_steps), pii_map, "cache")
+        
+        if not self._provider_available(self.GEMINI):
+            # Fall back to text-only decomposition
+            return await self.decompose_task(goal)
+        
+        if request_key is not None:
+            # Concurrent resubmissions of the same photo share one call
+            steps = await self._single_flight.do(
+                ("image",) + request_key,
+                lambda: self._call_gemini_multimodal(masked_goal, image_bytes, mime_type, request_key)
+            )
+        else:
+            steps = await self._call_gemini_multimodal(masked_goal, image_bytes, mime_type)
+        
+        if steps:
+            return self._build_result(goal, copy.deepcopy(steps), pii_map, "llm")
+        
+        # Fallback to text-only
+        return await self.decompose_task(goal)
+    
+    @staticmethod
+    def _image_digest(image_bytes: bytes) -> str:
+        """Content hash identifying an image independent of how it was uploaded."""
+        return hashlib.sha256(image_bytes).hexdigest()
+    
+    async def _call_gemini_multimodal(
+        self,
+        masked_goal: str,
+        image_bytes: bytes,
+        mime_type: str,
+        request_key: Optional[Tuple] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ask Gemini for steps given a masked goal and an image.
+        
+        Returns the masked steps (and caches them under `request_key`),
+        or None if the call failed.
+        """
+        original_size = len(image_bytes)
+        image_bytes, mime_type = await self._run_blocking(
+            self.image_service.preprocess, image_bytes, mime_type
+        )
+        
         prompt = f"""{self.SYSTEM_PROMPT}
 
 I'm sharing an image for context. Please analyze the image and break down this goal into specific, actionable micro-steps based on what you see.
@@ -509,8 +1283,6 @@ Look at the image carefully and create steps that are specific to the actual sit
         
         start_time = time.time()
         try:
-            client = genai.Client(api_key=self.settings.GEMINI_API_KEY)
-            
             # Prepare multimodal content with image
             contents = [
                 {
@@ -519,21 +1291,14 @@ Look at the image carefully and create steps that are specific to the actual sit
                         {
                             "inline_data": {
                                 "mime_type": mime_type,
-                                "data": image_base64
+                                "data": image_bytes
                             }
                         }
                     ]
                 }
             ]
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.models.generate_content(
-                    model=self.settings.GEMINI_MODEL,
-                    contents=contents
-                )
-            )
+            response = await self._gemini_generate(contents)
             
             content = response.text
             duration_ms = (time.time() - start_time) * 1000
@@ -545,7 +1310,7 @@ Look at the image carefully and create steps that are specific to the actual sit
                     f"Model: {self.settings.GEMINI_MODEL}",
                     f"Duration: {duration_ms:.2f}ms",
                     f"Goal: {masked_goal}",
-                    f"Image: {mime_type}, {len(image_base64)} bytes (base64)",
+                    f"Image: {mime_type}, {original_size} -> {len(image_bytes)} bytes",
                     f"Response:\n{content}"
                 ]
                 log_to_file("\n".join(log_entry))
@@ -555,31 +1320,16 @@ Look at the image carefully and create steps that are specific to the actual sit
             json_match = re.search(r'\[.*\]', content, re.DOTALL)
             if json_match:
                 steps = json.loads(json_match.group())
-                
-                # Calculate complexity
-                complexity = self._calculate_complexity(goal, steps)
-                
-                # Unmask PII
-                for step in steps:
-                    step['action'] = self.pii_service.unmask_text(step['action'], pii_map)
-                
-                # Ensure bounds
-                steps = steps[:10] if len(steps) > 10 else steps
-                
-                return {
-                    "steps": steps,
-                    "total_steps": len(steps),
-                    "all_steps": steps,
-                    "complexity_score": complexity
-                }
+                if steps and request_key is not None and self._image_cache is not None:
+                    self._image_cache.set(request_key, copy.deepcopy(steps))
+                return steps
                 
         except Exception as e:
-            print(f"Multimodal decomposition error: {e}")
+            logger.warning(f"Multimodal decomposition error: {e}")
             if LOGGER_AVAILABLE and self.settings.DEBUG:
                 log_to_file(f"[LLM ERROR] Multimodal: {str(e)}")
         
-        # Fallback to text-only
-        return await self.decompose_task(goal)
+        return None
 
 
 # Singleton instance
@@ -1,8 +1,38 @@
 import re
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Pattern, Set
+
+
+class MaskingContext:
+    """
+    State for masking one text: the masked result and its placeholder map.
+    
+    A fresh context is created for every call, so concurrent callers never
+    share counters or maps.
+    """
+    
+    def __init__(self, text: str):
+        self.original_text = text
+        self.masked_text = text
+        self.mask_map: Dict[str, str] = {}      # placeholder -> original
+        self.reverse_map: Dict[str, str] = {}   # original -> placeholder
+        self._counter = 0
+    
+    def add(self, pii_type: str, original: str) -> str:
+        """Register a masked value and return its unique placeholder."""
+        self._counter += 1
+        placeholder = f"[{pii_type.upper()}_{self._counter}]"
+        self.mask_map[placeholder] = original
+        self.reverse_map[original] = placeholder
+        return placeholder
+
 
 class PIIMaskingService:
-    """Service for masking Personally Identifiable Information before LLM calls."""
+    """
+    Service for masking Personally Identifiable Information before LLM calls.
+    
+    The service holds only compiled patterns; all per-call state lives in a
+    MaskingContext, so one instance can be used from many threads at once.
+    """
     
     # Patterns for PII detection
     PATTERNS = {
@@ -23,15 +53,104 @@ class PIIMaskingService:
         'apartment', 'apt', 'suite', 'ste', 'floor', 'building'
     ]
     
+    # Joins step texts for unmask_steps; never part of a placeholder
+    _STEP_SEPARATOR = '\x00'
+    
     def __init__(self):
-        self._mask_map: Dict[str, str] = {}
-        self._reverse_map: Dict[str, str] = {}
-        self._counter = 0
+        self._passes = self._compile_passes()
+        self._keywords = set(self.NAME_PREFIXES + self.LOCATION_INDICATORS)
+        self._keyword_detector = self._compile_detector()
+        self._digits_detector = re.compile(r'\d{3}')
+        self._safety_pattern = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in self.PATTERNS.values()),
+            re.IGNORECASE
+        )
+        
+        # Every placeholder mask() can produce, e.g. [NAME_2]
+        pii_types = dict.fromkeys(pii_type for pii_type, *_ in self._passes)
+        self._placeholder_pattern = re.compile(rf'\[(?:{"|".join(pii_types)})_\d+\]')
+
     
-    def _generate_placeholder(self, pii_type: str) -> str:
-        """Generate a unique placeholder for masked PII."""
-        self._counter += 1
-        return f"[{pii_type.upper()}_{self._counter}]"
+    def _compile_passes(self) -> List[Tuple[str, Pattern, int, bool, str]]:
+        """
+        Precompile the masking passes in the order they are applied.
+        
+        Each pass is (pii_type, regex, group, dedupe, gate): `group` is the
+        part of the match that gets masked, `dedupe` skips values that were
+        already masked, and `gate` is the detector hit the pass depends on.
+        """
+        passes = [
+            ('EMAIL', re.compile(self.PATTERNS['email'], re.IGNORECASE), 0, False, '@'),
+            ('PHONE', re.compile(self.PATTERNS['phone']), 0, True, 'digits'),
+            ('SSN', re.compile(self.PATTERNS['ssn']), 0, True, 'digits'),
+            ('CARD', re.compile(self.PATTERNS['credit_card']), 0, True, 'digits'),
+        ]
+        
+        # Potential names (words after name prefixes)
+        for prefix in self.NAME_PREFIXES:
+            pattern = rf'\b{prefix}\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\b'
+            passes.append(('NAME', re.compile(pattern, re.IGNORECASE), 1, True, prefix))
+        
+        # Locations (addresses)
+        for indicator in self.LOCATION_INDICATORS:
+            pattern = rf'\b(\d+\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+{indicator})\b'
+            passes.append(('LOCATION', re.compile(pattern, re.IGNORECASE), 0, True, indicator))
+        
+        return passes
+    
+    def _compile_detector(self) -> Pattern:
+        """
+        Build the keyword scan used to decide which name/location passes can match.
+        
+        Keywords are matched as whole words on lowercased ASCII text, which is
+        equivalent to the passes' case-insensitive matching for ASCII input.
+        """
+        keywords = sorted(self._keywords, key=len, reverse=True)
+        return re.compile(rf'\b({"|".join(keywords)})\b')
+    
+    def _detect(self, text: str) -> Set[str]:
+        """
+        Find which passes could match `text`.
+        
+        An email needs an '@', phone/SSN/card numbers need a run of 3 digits,
+        and name/location passes need their prefix or indicator as a word.
+        Masking only ever inserts bracketed placeholders, so a pass that
+        can't match the original text can't match after earlier passes either.
+        """
+        gates = set(self._keyword_detector.findall(text.lower())) if text.isascii() \
+            else set(self._keywords)
+        if '@' in text:
+            gates.add('@')
+        if self._digits_detector.search(text):
+            gates.add('digits')
+        return gates
+    
+    def mask(self, text: str) -> MaskingContext:
+        """
+        Mask all PII in text, returning a new per-call MaskingContext.
+        
+        A single detector scan finds which kinds of PII can be present and
+        only those passes run, so text without PII is returned after one scan.
+        """
+        context = MaskingContext(text)
+        
+        gates = self._detect(text)
+        if not gates:
+            return context
+        
+        masked_text = text
+        run_all = False
+        for pii_type, regex, group, dedupe, gate in self._passes:
+            if run_all or gate in gates:
+                masked_text, in_place = self._apply_pass(
+                    context, masked_text, regex, group, pii_type, dedupe
+                )
+                # A value replaced somewhere other than where it matched can create
+                # new words, so the detector result no longer holds
+                run_all = run_all or not in_place
+        
+        context.masked_text = masked_text
+        return context
     
     def mask_text(self, text: str) -> Tuple[str, Dict[str, str]]:
         """
@@ -40,87 +159,114 @@ class PIIMaskingService:
         Returns:
             Tuple of (masked_text, mapping_dict)
         """
-        self._mask_map = {}
-        self._reverse_map = {}
-        self._counter = 0
-        masked_text = text
+        context = self.mask(text)
+        return context.masked_text, context.mask_map
+    
+    def mask_many(self, texts: List[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Mask a list of texts, returning (masked_text, mapping_dict) per text in order.
         
-        # Mask emails
-        for match in re.finditer(self.PATTERNS['email'], masked_text, re.IGNORECASE):
-            original = match.group()
-            placeholder = self._generate_placeholder('EMAIL')
-            self._mask_map[placeholder] = original
-            self._reverse_map[original] = placeholder
-            masked_text = masked_text.replace(original, placeholder, 1)
-        
-        # Mask phone numbers
-        for match in re.finditer(self.PATTERNS['phone'], masked_text):
-            original = match.group()
-            if original not in self._reverse_map:
-                placeholder = self._generate_placeholder('PHONE')
-                self._mask_map[placeholder] = original
-                self._reverse_map[original] = placeholder
-                masked_text = masked_text.replace(original, placeholder, 1)
-        
-        # Mask SSNs
-        for match in re.finditer(self.PATTERNS['ssn'], masked_text):
-            original = match.group()
-            if original not in self._reverse_map:
-                placeholder = self._generate_placeholder('SSN')
-                self._mask_map[placeholder] = original
-                self._reverse_map[original] = placeholder
-                masked_text = masked_text.replace(original, placeholder, 1)
-        
-        # Mask credit cards
-        for match in re.finditer(self.PATTERNS['credit_card'], masked_text):
-            original = match.group()
-            if original not in self._reverse_map:
-                placeholder = self._generate_placeholder('CARD')
-                self._mask_map[placeholder] = original
-                self._reverse_map[original] = placeholder
-                masked_text = masked_text.replace(original, placeholder, 1)
-        
-        # Mask potential names (words after name prefixes)
-        for prefix in self.NAME_PREFIXES:
-            pattern = rf'\b{prefix}\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\b'
-            for match in re.finditer(pattern, masked_text, re.IGNORECASE):
-                original = match.group(1)
-                if original not in self._reverse_map:
-                    placeholder = self._generate_placeholder('NAME')
-                    self._mask_map[placeholder] = original
-                    self._reverse_map[original] = placeholder
-                    masked_text = masked_text.replace(original, placeholder, 1)
-        
-        # Mask locations (addresses)
-        for indicator in self.LOCATION_INDICATORS:
-            pattern = rf'\b(\d+\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+{indicator})\b'
-            for match in re.finditer(pattern, masked_text, re.IGNORECASE):
-                original = match.group()
-                if original not in self._reverse_map:
-                    placeholder = self._generate_placeholder('LOCATION')
-                    self._mask_map[placeholder] = original
-                    self._reverse_map[original] = placeholder
-                    masked_text = masked_text.replace(original, placeholder, 1)
+        Masking is pure-Python regex work that holds the GIL, so the batch is
+        masked sequentially; callers run it off the event loop as one job.
+        """
+        return [self.mask_text(text) for text in texts]
+    
+    def _apply_pass(
+        self,
+        context: MaskingContext,
+        text: str,
+        regex: Pattern,
+        group: int,
+        pii_type: str,
+        dedupe: bool
+    ) -> Tuple[str, bool]:
+        """
+        Mask every match of one pass, building the result with a single join.
+        
+        Each value replaces the first occurrence of that value in the text,
+        which is normally the match itself. If the value also occurs earlier
+        the rest of the pass falls back to str.replace so placeholders land
+        exactly where they always have.
+        
+        Returns (masked_text, in_place) where in_place is False if any value
+        was replaced away from its match.
+        """
+        pieces: List[str] = []
+        pos = 0
+        fallback_text = None
+        
+        for match in regex.finditer(text):
+            original = match.group(group)
+            if dedupe and original in context.reverse_map:
+                continue
+            
+            placeholder = context.add(pii_type, original)
+            
+            if fallback_text is None:
+                start = match.start(group)
+                prefix = "".join(pieces) + text[pos:start]
+                if original not in prefix + original[:-1]:
+                    pieces.append(text[pos:start])
+                    pieces.append(placeholder)
+                    pos = match.end(group)
+                    continue
+                fallback_text = prefix + text[start:]
+            
+            fallback_text = fallback_text.replace(original, placeholder, 1)
+        
+        if fallback_text is not None:
+            return fallback_text, False
         
-        return masked_text, self._mask_map.copy()
+        pieces.append(text[pos:])
+        return "".join(pieces), True
     
     def unmask_text(self, masked_text: str, mask_map: Dict[str, str]) -> str:
         """
         Restore original PII values in text using the mapping.
+        
+        Placeholders are found with one precompiled scan and substituted in
+        the same pass.
+        """
+        if not mask_map or '[' not in masked_text:
+            return masked_text
+        return self._placeholder_pattern.sub(
+            lambda match: mask_map.get(match[0], match[0]),
+            masked_text
+        )
+    
+    def unmask_steps(
+        self,
+        steps: List[Dict],
+        mask_map: Dict[str, str],
+        key: str = 'action'
+    ) -> List[Dict]:
         """
-        unmasked_text = masked_text
-        for placeholder, original in mask_map.items():
-            unmasked_text = unmasked_text.replace(placeholder, original)
-        return unmasked_text
+        Restore original PII values in `step[key]` for a whole list of steps.
+        
+        The values are joined and unmasked with a single scan. Steps are
+        updated in place and the same list is returned.
+        """
+        if not mask_map or not steps:
+            return steps
+        
+        texts = [step[key] for step in steps]
+        joined = self._STEP_SEPARATOR.join(texts)
+        if joined.count(self._STEP_SEPARATOR) != len(texts) - 1:
+            # A value contains the separator itself; unmask one by one
+            for step in steps:
+                step[key] = self.unmask_text(step[key], mask_map)
+            return steps
+        
+        unmasked = self.unmask_text(joined, mask_map).split(self._STEP_SEPARATOR)
+        for step, text in zip(steps, unmasked):
+            step[key] = text
+        return steps
     
     def is_safe_for_llm(self, text: str) -> bool:
         """
         Check if text is safe to send to LLM (no obvious PII).
         """
-        for pattern in self.PATTERNS.values():
-            if re.search(pattern, text, re.IGNORECASE):
-                return False
-        return True
+        return self._safety_pattern.search(text) is None
 
 
 # Singleton instance
@@ -1,25 +1,51 @@
-import json
+import hashlib
 from typing import Optional, Dict, Any, List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 from models import User
+from config import get_settings
+from services.cache_service import TTLCache
 from services.encryption_service import get_encryption_service
 from services.gamification_service import get_gamification_service
+from services.energy_service import get_energy_service
 
 class ProfileService:
     """
     Service for managing user profiles with encryption.
     
     Handles creation, retrieval, and updates of user profiles
-    while ensuring sensitive data is encrypted at rest.
+    while ensuring sensitive data is encrypted at rest. Database
+    methods take an AsyncSession and must be awaited.
     """
     
+    # Public profile fields, in response order (each is also a User column)
+    PROFILE_FIELDS = (
+        "id", "name", "font_preference", "high_contrast", "triggers",
+        "preferences", "streak_count", "badges", "energy_log", "created_at"
+    )
+    
+    # energy_log is read from energy_entries: the most recent readings only
+    PROFILE_ENERGY_LOG_ENTRIES = 100
+    
     def __init__(self):
+        self.settings = get_settings()
         self.encryption = get_encryption_service()
         self.gamification = get_gamification_service()
+        self.energy = get_energy_service()
+        
+        # Decrypted plaintext of encrypted fields, keyed on (user id, ciphertext digest).
+        # New ciphertext means a new key, so updates never serve stale values.
+        self._decrypted_cache = TTLCache(
+            max_entries=self.settings.PROFILE_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.settings.PROFILE_CACHE_TTL_SECONDS,
+            max_bytes=self.settings.PROFILE_CACHE_MAX_BYTES,
+            size_of=len
+        ) if self.settings.PROFILE_CACHE_ENABLED else None
     
-    def create_user(
+    async def create_user(
         self,
-        db: Session,
+        db: AsyncSession,
         name: str,
         font_preference: str = "Lexend",
         high_contrast: bool = False,
@@ -40,55 +66,138 @@ class ProfileService:
             triggers=encrypted_triggers,
             preferences=encrypted_preferences,
             streak_count=0,
-            badges="[]",
-            energy_log="[]"
+            badges="[]"
         )
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         return user
     
-    def get_user(self, db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    def parse_fields(self, fields: Optional[str]) -> Optional[List[str]]:
+        """
+        Parse a comma-separated `fields=` value into profile field names.
+        
+        Returns None (all fields) when no fields are given. Raises ValueError
+        for unknown field names.
+        """
+        if not fields:
+            return None
+        
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - set(self.PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Unknown fields: {', '.join(sorted(unknown))}. "
+                f"Available: {', '.join(self.PROFILE_FIELDS)}"
+            )
+        return [field for field in self.PROFILE_FIELDS if field in requested]
+    
+    async def get_user(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        fields: Optional[List[str]] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         Get user by ID with decrypted sensitive fields.
+        
+        With `fields`, only those columns are loaded, decrypted and returned.
         """
-        user = db.query(User).filter(User.id == user_id).first()
+        query = select(User).where(User.id == user_id)
+        if fields:
+            columns = [getattr(User, field) for field in fields if field != "energy_log"]
+            query = query.options(load_only(*(columns or [User.id])))
+        user = (await db.execute(query)).scalar_one_or_none()
         
         if not user:
             return None
         
-        return self._user_to_dict(user)
+        return await self._user_to_dict(db, user, fields)
     
-    def _user_to_dict(self, user: User) -> Dict[str, Any]:
-        """Convert user model to dictionary with decryption."""
+    async def _user_to_dict(
+        self,
+        db: AsyncSession,
+        user: User,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Convert user model to dictionary with decryption.
+        
+        Only the requested fields are read, so encrypted fields are
+        decrypted, and energy readings queried, only when asked for.
+        """
+        fields = fields or self.PROFILE_FIELDS
+        energy_log = None
+        if "energy_log" in fields:
+            energy_log = await self.energy.get_energy_entries(
+                db, user.id, limit=self.PROFILE_ENERGY_LOG_ENTRIES
+            )
         return {
-            "id": user.id,
-            "name": user.name,
-            "font_preference": user.font_preference,
-            "high_contrast": user.high_contrast,
-            "triggers": self.encryption.decrypt_json(user.triggers, []),
-            "preferences": self.encryption.decrypt_json(user.preferences, {}),
-            "streak_count": user.streak_count,
-            "badges": self.gamification.parse_badges(user.badges),
-            "energy_log": json.loads(user.energy_log) if user.energy_log else [],
-            "created_at": user.created_at.isoformat() if user.created_at else None
+            field: energy_log if field == "energy_log" else self._field_value(user, field)
+            for field in fields
         }
     
-    def update_preferences(
+    def _field_value(self, user: User, field: str) -> Any:
+        """Serialize a single profile field."""
+        if field == "triggers":
+            return self._decrypt_field(user.id, user.triggers, [])
+        if field == "preferences":
+            return self._decrypt_field(user.id, user.preferences, {})
+        if field == "badges":
+            return self.gamification.parse_badges(user.badges)
+        if field == "created_at":
+            return user.created_at.isoformat() if user.created_at else None
+        return getattr(user, field)
+    
+    def _decrypt_field(self, user_id: int, encrypted_data: str, default: Any) -> Any:
+        """
+        Decrypt an encrypted profile field, reusing cached plaintext when possible.
+        
+        Plaintext (not the parsed object) is cached, so every caller gets
+        its own freshly parsed copy.
+        """
+        if self._decrypted_cache is None:
+            return self.encryption.decrypt_json(encrypted_data, default)
+        
+        if not encrypted_data:
+            return default
+        
+        key = (user_id, hashlib.sha256(encrypted_data.encode()).digest())
+        plaintext = self._decrypted_cache.get(key)
+        if plaintext is None:
+            plaintext = self.encryption.decrypt_text(encrypted_data)
+            if plaintext is None:
+                return default
+            self._decrypted_cache.set(key, plaintext)
+        
+        result = self.encryption.parse_decrypted(plaintext)
+        return result if result is not None else default
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get decrypted-field cache statistics."""
+        stats = {"enabled": self._decrypted_cache is not None}
+        if self._decrypted_cache is not None:
+            stats.update(self._decrypted_cache.stats())
+        return stats
+    
+    async def update_preferences(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         font_preference: Optional[str] = None,
         high_contrast: Optional[bool] = None,
         triggers: Optional[List[str]] = None,
-        preferences: Optional[Dict[str, Any]] = None
+        preferences: Optional[Dict[str, Any]] = None,
+        fields: Optional[List[str]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Update user preferences with encryption.
+        
+        Returns the updated profile, limited to `fields` if given.
         """
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         
         if not user:
             return None
@@ -105,20 +214,20 @@ class ProfileService:
         if preferences is not None:
             user.preferences = self.encryption.encrypt_json(preferences)
         
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
-        return self._user_to_dict(user)
+        return await self._user_to_dict(db, user, fields)
     
-    def update_streak(
+    async def update_streak(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         new_streak: int,
         new_badges_json: str
     ) -> bool:
         """Update user's streak and badges."""
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         
         if not user:
             return False
@@ -126,29 +235,12 @@ class ProfileService:
         user.streak_count = new_streak
         user.badges = new_badges_json
         
-        db.commit()
-        return True
-    
-    def update_energy_log(
-        self,
-        db: Session,
-        user_id: int,
-        energy_log_json: str
-    ) -> bool:
-        """Update user's energy log."""
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            return False
-        
-        user.energy_log = energy_log_json
-        
-        db.commit()
+        await db.commit()
         return True
     
-    def get_user_model(self, db: Session, user_id: int) -> Optional[User]:
+    async def get_user_model(self, db: AsyncSession, user_id: int) -> Optional[User]:
         """Get raw user model (for internal use)."""
-        return db.query(User).filter(User.id == user_id).first()
+        return await db.get(User, user_id)
 
 
 # Singleton instance
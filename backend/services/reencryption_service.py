@@ -0,0 +1,320 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from cryptography.fernet import InvalidToken
+from sqlalchemy import bindparam, func
+import leases
+from config import get_settings
+from database import SessionLocal
+from models import User, ReencryptionJob
+from services.encryption_service import get_encryption_service
+
+logger = logging.getLogger(__name__)
+
+
+class ReencryptionService:
+    """
+    Background job re-encrypting users' encrypted fields under the primary key.
+
+    Users are processed in id order, REENCRYPT_CHUNK_SIZE at a time. Each
+    chunk is re-encrypted on a thread pool and written in its own short
+    transaction along with the job's cursor (last_user_id), so the job can
+    stop at any point and resume where it left off. Rows changed by a user
+    while their chunk is in flight are left alone: the update only applies
+    if the stored ciphertext is still the one that was read.
+
+    Every worker process starts the job; the one holding its lease (see
+    leases.py) runs it and the others stand by, taking over if it stops.
+    """
+
+    ENCRYPTED_FIELDS = ("triggers", "preferences")
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.encryption = get_encryption_service()
+        self.chunk_size = max(1, self.settings.REENCRYPT_CHUNK_SIZE)
+        self.lease_seconds = max(1, self.settings.JOB_LEASE_SECONDS)
+        self._lease_name = f"reencryption:{self.encryption.key_id}"
+        self._task: Optional[asyncio.Task] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # Checked before each chunk; a chunk already running in its thread can't be cancelled
+        self._stop_requested = threading.Event()
+        self._progress: Dict[str, Any] = {"status": "idle", "key_id": self.encryption.key_id}
+
+    def start(self) -> Dict[str, Any]:
+        """Start (or resume) the job in the background; no-op if it is already running."""
+        if self._task is None or self._task.done():
+            self._progress["status"] = "starting"
+            self._stop_requested.clear()
+            self._task = asyncio.create_task(self._run())
+        return self.status()
+
+    async def stop(self) -> None:
+        """Stop a running job once its current chunk is written; progress is kept for resuming."""
+        self._stop_requested.set()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """Get job progress."""
+        return dict(self._progress)
+
+    async def _run(self) -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.settings.REENCRYPT_WORKERS,
+            thread_name_prefix="reencrypt"
+        )
+        try:
+            while True:
+                await self._in_thread(self._prepare_job)
+                # Each chunk runs off the event loop; stopping takes effect between chunks
+                while await self._in_thread(self._process_chunk):
+                    pass
+                if self._progress["status"] != "standby":
+                    break
+                # Another worker holds the lease: check again once it could have expired
+                await asyncio.sleep(self.lease_seconds)
+        except asyncio.CancelledError:
+            self._progress["status"] = "paused"
+            raise
+        except Exception as e:
+            logger.exception("Re-encryption job failed")
+            self._progress.update({"status": "failed", "error": str(e)})
+            await asyncio.to_thread(self._record_failure, str(e))
+        finally:
+            # Safe: _in_thread doesn't return while a chunk is still using the pool
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            await asyncio.to_thread(self._release_lease)
+
+    async def _in_thread(self, func):
+        """
+        Run one step of the job in a thread.
+
+        A thread can't be interrupted, so if the job is cancelled meanwhile the
+        step is asked to stop and awaited before the cancellation propagates.
+        """
+        step = asyncio.ensure_future(asyncio.to_thread(func))
+        try:
+            return await asyncio.shield(step)
+        except asyncio.CancelledError:
+            self._stop_requested.set()
+            await asyncio.wait({step})
+            raise
+
+    def run_until_complete(self) -> Dict[str, Any]:
+        """Run the whole job in the calling thread (used by the command line entry point)."""
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.settings.REENCRYPT_WORKERS,
+            thread_name_prefix="reencrypt"
+        )
+        self._stop_requested.clear()
+        try:
+            self._prepare_job()
+            while self._process_chunk():
+                pass
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+            self._release_lease()
+        return self.status()
+
+    def _prepare_job(self) -> None:
+        """Claim the job's lease, then load or create its row for the current primary key."""
+        db = SessionLocal()
+        try:
+            job = db.query(ReencryptionJob).filter(
+                ReencryptionJob.key_id == self.encryption.key_id
+            ).first()
+            if job is not None and job.status == "completed":
+                self._sync_progress(job)
+                return
+            if not leases.claim(db, self._lease_name, self.lease_seconds):
+                if job is not None:
+                    self._sync_progress(job)
+                self._progress["status"] = "standby"
+                return
+
+            # Reloaded: the previous holder may have progressed since
+            job = db.query(ReencryptionJob).filter(
+                ReencryptionJob.key_id == self.encryption.key_id
+            ).first()
+            if job is None:
+                job = ReencryptionJob(key_id=self.encryption.key_id, last_user_id=0)
+                db.add(job)
+
+            if job.status != "completed":
+                job.status = "running"
+                job.error = None
+                remaining = db.query(func.count(User.id)).filter(User.id > job.last_user_id).scalar()
+                job.total_users = (job.processed_users or 0) + remaining
+            db.commit()
+            self._sync_progress(job)
+
+            if job.status == "running":
+                logger.info(
+                    f"Re-encryption {job.key_id}: resuming after user {job.last_user_id}, "
+                    f"{job.total_users - job.processed_users} users left"
+                )
+        finally:
+            db.close()
+
+    def _process_chunk(self) -> bool:
+        """
+        Re-encrypt the next chunk of users and commit it with the cursor.
+
+        Returns False once there is nothing left to do.
+        """
+        if self._progress.get("status") != "running":
+            return False
+        if self._stop_requested.is_set():
+            self._progress["status"] = "paused"
+            return False
+
+        start_time = time.time()
+        db = SessionLocal()
+        try:
+            job = db.query(ReencryptionJob).filter(
+                ReencryptionJob.key_id == self.encryption.key_id
+            ).one()
+
+            rows = db.query(User.id, User.triggers, User.preferences) \
+                .filter(User.id > job.last_user_id) \
+                .order_by(User.id) \
+                .limit(self.chunk_size) \
+                .all()
+
+            if not rows:
+                job.status = "completed"
+                job.completed_at = datetime.utcnow()
+                if not self._commit_if_leased(db):
+                    return False
+                self._sync_progress(job)
+                logger.info(
+                    f"Re-encryption {job.key_id} complete: {job.rotated_fields} fields rotated, "
+                    f"{job.failed_fields} unreadable"
+                )
+                return False
+
+            updates: Dict[str, List[Dict[str, Any]]] = {field: [] for field in self.ENCRYPTED_FIELDS}
+            for user_id, field_updates, failed in self._pool.map(self._reencrypt_row, rows):
+                job.failed_fields += failed
+                for field, old, new in field_updates:
+                    updates[field].append({"user_id": user_id, "old": old, "new": new})
+
+            users = User.__table__
+            for field, params in updates.items():
+                if params:
+                    column = users.c[field]
+                    result = db.execute(
+                        users.update()
+                        .where(users.c.id == bindparam("user_id"), column == bindparam("old"))
+                        .values({field: bindparam("new")}),
+                        params
+                    )
+                    # Rows a user rewrote meanwhile don't match and aren't counted
+                    job.rotated_fields += result.rowcount if result.rowcount >= 0 else len(params)
+
+            job.last_user_id = rows[-1].id
+            job.processed_users += len(rows)
+            if not self._commit_if_leased(db):
+                return False
+            self._sync_progress(job)
+
+            logger.info(
+                f"Re-encryption {job.key_id}: {job.processed_users}/{job.total_users} users "
+                f"({(time.time() - start_time) * 1000:.0f}ms for {len(rows)})"
+            )
+            return True
+        finally:
+            db.close()
+
+    def _commit_if_leased(self, db) -> bool:
+        """Commit a chunk if this worker still holds the lease; otherwise roll it back and stand by."""
+        if not leases.renew(db, self._lease_name, self.lease_seconds):
+            db.rollback()
+            logger.warning(f"Re-encryption {self.encryption.key_id}: lease taken over by another worker")
+            self._progress["status"] = "standby"
+            return False
+        db.commit()
+        return True
+
+    def _release_lease(self) -> None:
+        db = SessionLocal()
+        try:
+            leases.release(db, self._lease_name)
+        finally:
+            db.close()
+
+    def _reencrypt_row(self, row: Tuple) -> Tuple[int, List[Tuple[str, str, str]], int]:
+        """Re-encrypt one user's fields; returns (user_id, [(field, old, new)], failed_count)."""
+        user_id = row[0]
+        field_updates = []
+        failed = 0
+        for field, token in zip(self.ENCRYPTED_FIELDS, row[1:]):
+            if not token:
+                continue
+            try:
+                new_token = self.encryption.reencrypt(token)
+            except InvalidToken:
+                failed += 1
+                continue
+            if new_token is not None:
+                field_updates.append((field, token, new_token))
+        return user_id, field_updates, failed
+
+    def _record_failure(self, error: str) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(ReencryptionJob).filter(
+                ReencryptionJob.key_id == self.encryption.key_id
+            ).first()
+            if job is not None:
+                job.status = "failed"
+                job.error = error
+                db.commit()
+        finally:
+            db.close()
+
+    def _sync_progress(self, job: ReencryptionJob) -> None:
+        total = job.total_users or 0
+        self._progress = {
+            "status": job.status,
+            "key_id": job.key_id,
+            "processed_users": job.processed_users,
+            "total_users": total,
+            "percent": round(job.processed_users / total * 100, 1) if total else 100.0,
+            "rotated_fields": job.rotated_fields,
+            "failed_fields": job.failed_fields,
+            "last_user_id": job.last_user_id,
+            "error": job.error
+        }
+
+
+# Singleton instance
+_reencryption_service = None
+
+def get_reencryption_service() -> ReencryptionService:
+    """Get or create the re-encryption service singleton."""
+    global _reencryption_service
+    if _reencryption_service is None:
+        _reencryption_service = ReencryptionService()
+    return _reencryption_service
+
+
+if __name__ == "__main__":
+    # python -m services.reencryption_service  (from backend/)
+    from database import init_db
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_db()
+    print(get_reencryption_service().run_until_complete())
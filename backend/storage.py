@@ -0,0 +1,134 @@
+"""
+Storage configuration for the SQLAlchemy engines.
+
+SQLite defaults suit a single-threaded script, not several gunicorn workers
+writing to the same file: the rollback journal blocks readers during a
+write, and a writer that finds the database locked gives up after a short
+wait. Every new SQLite connection is switched to WAL with a busy timeout
+and larger page/mmap caches, and the connection pool is capped so that all
+worker processes together normally stay within DB_MAX_CONNECTIONS. SQLite
+allows one writer at a time and waiting writers poll for the lock, so a
+small pool keeps tail latency down: requests queue for a connection
+in-process rather than busy-waiting on the file lock.
+
+The pool is sized for database work only: handlers must not keep a
+connection checked out while awaiting something else, such as an LLM call
+(see database.release_connection). Otherwise a couple of slow requests hold
+the whole pool and the rest fail with a pool timeout. DB_MAX_OVERFLOW allows
+temporary connections beyond the pool, at the cost of more writers waiting
+on the SQLite lock.
+"""
+
+import logging
+from typing import Any, Dict, List
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# INSERT ... ON CONFLICT support by dialect
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+def is_sqlite(url: str) -> bool:
+    """True for sqlite:// URLs, with or without a driver (sqlite+aiosqlite://)."""
+    return url.split("://", 1)[0].split("+", 1)[0] == "sqlite"
+
+
+def _is_memory(url: str) -> bool:
+    path = url.split("://", 1)[-1].lstrip("/")
+    return path in ("", ":memory:") or "mode=memory" in path
+
+
+def _choice(value: str, allowed: set, default: str, name: str) -> str:
+    """Validate a pragma keyword (they are interpolated into the PRAGMA statement)."""
+    value = value.upper()
+    if value not in allowed:
+        logger.warning(f"Invalid {name} '{value}', using {default}")
+        return default
+    return value
+
+
+def sqlite_pragmas() -> List[str]:
+    """PRAGMA statements run on every new SQLite connection."""
+    settings = get_settings()
+    journal_mode = _choice(settings.SQLITE_JOURNAL_MODE, JOURNAL_MODES, "WAL", "SQLITE_JOURNAL_MODE")
+    synchronous = _choice(settings.SQLITE_SYNCHRONOUS, SYNCHRONOUS_MODES, "NORMAL", "SQLITE_SYNCHRONOUS")
+    temp_store = _choice(settings.SQLITE_TEMP_STORE, TEMP_STORES, "MEMORY", "SQLITE_TEMP_STORE")
+    return [
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size={-abs(int(settings.SQLITE_CACHE_SIZE_KB))}",
+        f"PRAGMA temp_store={temp_store}",
+    ]
+
+
+def pool_size_per_worker() -> int:
+    """Connections each worker process may hold (DB_MAX_CONNECTIONS split across WORKERS)."""
+    settings = get_settings()
+    if settings.DB_POOL_SIZE > 0:
+        return settings.DB_POOL_SIZE
+    return max(2, settings.DB_MAX_CONNECTIONS // max(1, settings.WORKERS))
+
+
+def engine_options(url: str, pool_size: int = None) -> Dict[str, Any]:
+    """
+    Keyword arguments for create_engine/create_async_engine.
+
+    Pools keep pool_size connections, plus up to DB_MAX_OVERFLOW (default none) while exhausted.
+    In-memory SQLite keeps SQLAlchemy's default single-connection pool.
+    """
+    settings = get_settings()
+    options: Dict[str, Any] = {}
+    if is_sqlite(url):
+        # Sessions may be used from threads other than the one that opened them
+        options["connect_args"] = {"check_same_thread": False}
+        if _is_memory(url):
+            return options
+
+    options.update(
+        pool_size=pool_size or pool_size_per_worker(),
+        max_overflow=max(0, settings.DB_MAX_OVERFLOW),
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_pre_ping=not is_sqlite(url)
+    )
+    return options
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Apply the SQLite pragmas to every connection the engine opens (pass async_engine.sync_engine)."""
+    if not is_sqlite(str(engine.url)):
+        return engine
+
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def describe(engine: Engine) -> Dict[str, Any]:
+    """Dialect and pool usage, for the health endpoint."""
+    return {
+        "dialect": engine.dialect.name,
+        "pool": engine.pool.status(),
+    }
@@ -0,0 +1,156 @@
+"""
+Streaming multipart/form-data parsing for image uploads.
+
+Starlette's form parser spools every file part to a temporary file before
+the endpoint runs, so an oversized upload is only noticed after it has been
+received in full. This parser reads the request stream chunk by chunk,
+collects the single image part into one buffer and stops as soon as the
+image (or any text field) exceeds its size limit.
+"""
+
+from typing import Dict, Optional
+from fastapi import Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # pragma: no cover - older python-multipart releases
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# Text fields (user_id, goal, ...) are tiny; anything larger is rejected
+MAX_FIELD_SIZE = 16 * 1024
+MAX_FIELDS = 10
+
+# Multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised for malformed or oversized uploads."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class MultipartUpload:
+    """Result of parsing an upload: text fields plus at most one file."""
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.file_field: Optional[str] = None
+        self.file_mime_type: Optional[str] = None
+        self.file_data = bytearray()
+
+
+class _StreamingMultipartParser:
+    """Callback target for python-multipart's push parser."""
+
+    def __init__(self, max_file_size: int):
+        self.max_file_size = max_file_size
+        self.upload = MultipartUpload()
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._field_name: Optional[str] = None
+        self._field_data = bytearray()
+        self._is_file = False
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_data = bytearray()
+        self._is_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError('Each part needs a Content-Disposition "name"')
+        self._field_name = options[b"name"].decode("utf-8", errors="replace")
+
+        if b"filename" in options:
+            if self.upload.file_field is not None:
+                raise UploadError("Only one file can be uploaded")
+            self._is_file = True
+            self.upload.file_field = self._field_name
+            content_type, _ = parse_options_header(self._headers.get(b"content-type", b""))
+            self.upload.file_mime_type = content_type.decode("latin-1") or None
+        elif len(self.upload.fields) >= MAX_FIELDS:
+            raise UploadError("Too many form fields")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._is_file:
+            # Appended straight into the single upload buffer
+            if len(self.upload.file_data) + (end - start) > self.max_file_size:
+                raise UploadError(
+                    f"Image exceeds maximum size of {self.max_file_size // (1024 * 1024)}MB",
+                    status_code=413
+                )
+            self.upload.file_data += data[start:end]
+        else:
+            if len(self._field_data) + (end - start) > MAX_FIELD_SIZE:
+                raise UploadError(f"Field '{self._field_name}' is too large", status_code=413)
+            self._field_data += data[start:end]
+
+    def on_part_end(self):
+        if not self._is_file:
+            self.upload.fields[self._field_name] = self._field_data.decode("utf-8", errors="replace")
+
+
+async def read_multipart_upload(request: Request, max_file_size: int) -> MultipartUpload:
+    """
+    Parse a multipart/form-data request body while it streams in.
+
+    Raises UploadError (413) as soon as the file part grows past
+    `max_file_size`, or up front when Content-Length already says so.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data":
+        raise UploadError("Expected multipart/form-data", status_code=415)
+
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() \
+            and int(content_length) > max_file_size + MULTIPART_OVERHEAD:
+        raise UploadError(
+            f"Image exceeds maximum size of {max_file_size // (1024 * 1024)}MB",
+            status_code=413
+        )
+
+    target = _StreamingMultipartParser(max_file_size)
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": target.on_part_begin,
+        "on_part_data": target.on_part_data,
+        "on_part_end": target.on_part_end,
+        "on_header_field": target.on_header_field,
+        "on_header_value": target.on_header_value,
+        "on_header_end": target.on_header_end,
+        "on_headers_finished": target.on_headers_finished,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except UploadError:
+        raise
+    except Exception as e:
+        raise UploadError(f"Invalid multipart data: {e}")
+
+    return target.upload
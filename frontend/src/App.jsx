@@ -11,6 +11,9 @@ import ImageUpload from './components/ImageUpload'
 // API base URL
 const API_BASE = ''
 
+// Profile fields the app uses; skips decrypting triggers/preferences and the energy log
+const PROFILE_FIELDS = 'id,name,font_preference,high_contrast,streak_count,badges'
+
 function App() {
   // User state
   const [user, setUser] = useState(null)
@@ -59,7 +62,7 @@ function App() {
   const loadUser = async (id) => {
     try {
       setLoading(true)
-      const res = await fetch(`${API_BASE}/users/${id}`)
+      const res = await fetch(`${API_BASE}/users/${id}?fields=${PROFILE_FIELDS}`)
       if (res.ok) {
         const userData = await res.json()
         setUser(userData)
@@ -81,7 +84,7 @@ function App() {
   const createUser = async (userData) => {
     try {
       setLoading(true)
-      const res = await fetch(`${API_BASE}/users/create`, {
+      const res = await fetch(`${API_BASE}/users/create?fields=${PROFILE_FIELDS}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(userData)
@@ -108,7 +111,7 @@ function App() {
     if (!user) return
     
     try {
-      const res = await fetch(`${API_BASE}/users/${user.id}/preferences`, {
+      const res = await fetch(`${API_BASE}/users/${user.id}/preferences?fields=${PROFILE_FIELDS}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(prefs)
@@ -159,8 +162,8 @@ function App() {
           setImagePrompt(data.image_prompt)
           setShowImageUpload(true)
         } else {
-          // No image needed, proceed with decomposition
-          await decomposeTask(goal)
+          // No image needed, proceed with decomposition (already started server-side)
+          await decomposeTask(goal, data.handoff_token)
         }
       } else {
         // If analysis fails, proceed without image
@@ -181,7 +184,7 @@ function App() {
     
     if (imageData) {
       // User provided an image, decompose with it
-      await decomposeTaskWithImage(pendingGoal, imageData.base64, imageData.mimeType)
+      await decomposeTaskWithImage(pendingGoal, imageData.file)
     } else {
       // User skipped, decompose without image
       await decomposeTask(pendingGoal)
@@ -192,20 +195,20 @@ function App() {
   }
   
   // Decompose task with image context
-  const decomposeTaskWithImage = async (goal, imageBase64, mimeType) => {
+  const decomposeTaskWithImage = async (goal, imageFile) => {
     if (!user) return
     
     try {
       setLoading(true)
-      const res = await fetch(`${API_BASE}/tasks/decompose`, {
+      // Browser sets the multipart Content-Type (with boundary) itself
+      const form = new FormData()
+      form.append('user_id', user.id)
+      form.append('goal', goal)
+      form.append('image', imageFile)
+      
+      const res = await fetch(`${API_BASE}/tasks/decompose/upload`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          user_id: user.id,
-          goal: goal,
-          image_base64: imageBase64,
-          image_mime_type: mimeType
-        })
+        body: form
       })
       
       if (res.ok) {
@@ -236,7 +239,7 @@ function App() {
     }
   }
   
-  const decomposeTask = async (goal) => {
+  const decomposeTask = async (goal, handoffToken = null) => {
     if (!user) return
     
     try {
@@ -246,7 +249,8 @@ function App() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           user_id: user.id,
-          goal: goal
+          goal: goal,
+          handoff_token: handoffToken
         })
       })
       
@@ -15,14 +15,8 @@ function ImageUpload({ imagePrompt, onSubmit, onSkip }) {
       const previewUrl = URL.createObjectURL(file)
       setPreview(previewUrl)
       
-      const base64 = await new Promise((resolve, reject) => {
-        const reader = new FileReader()
-        reader.onload = () => resolve(reader.result.split(',')[1])
-        reader.onerror = reject
-        reader.readAsDataURL(file)
-      })
-      
-      setImageData({ base64, mimeType: file.type || 'image/jpeg' })
+      // The file is uploaded as-is (multipart), no base64 encoding needed
+      setImageData({ file, mimeType: file.type || 'image/jpeg' })
     } finally {
       setLoading(false)
     }